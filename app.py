@@ -1,7 +1,8 @@
-from flask import Flask
+from flask import Flask, request
 from flask_cors import CORS
 from utils.routes import routes_blueprint
 from utils.auth_routes import auth_blueprint
+from utils import metrics
 
 app = Flask(__name__)
 CORS(app)
@@ -9,7 +10,19 @@ CORS(app)
 app.register_blueprint(routes_blueprint)
 app.register_blueprint(auth_blueprint)
 
+# One root span per request, closed once the body (streamed or not) has been sent
+@app.before_request
+def start_request_span():
+    metrics.startRequest(request.endpoint or "unknown")
+
+@app.after_request
+def end_request_span(response):
+    root, endpoint, status = metrics.current(), request.endpoint or "unknown", response.status_code
+    response.call_on_close(lambda: metrics.endRequest(root, endpoint, status))
+    return response
+
 if __name__ == "__main__":
     app.run(debug=True)
 
-# gunicorn -c gunicorn_config.py app:app
\ No newline at end of file
+# gunicorn -c gunicorn_config.py app:app
+# uvicorn asgi:application --host 0.0.0.0 --port 5000
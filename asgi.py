@@ -0,0 +1,9 @@
+import os
+from a2wsgi import WSGIMiddleware
+from app import app
+
+# ASGI entry point: the same Flask app and blueprints, with each request run on
+# a thread pool so slow tools and streaming chats don't hold up other users.
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+application = WSGIMiddleware(app, workers=int(os.getenv("ASGI_THREADS", "32")))
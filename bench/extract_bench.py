@@ -0,0 +1,112 @@
+"""
+Benchmark the streaming paragraph extractor against the old BeautifulSoup path.
+
+    python -m bench.extract_bench [pages_dir] [--limit 500] [--repeat 3] [--synthetic]
+
+pages_dir holds saved *.html pages (default bench/corpus, a few committed real
+page shapes; put larger local collections in the gitignored bench/pages).
+--synthetic adds news-like pages (boilerplate, scripts, 50 KB - 3 MB) for timing.
+
+Alongside speed, each page reports output parity on the full text: the share
+of BeautifulSoup's paragraphs the extractor also returns (below 100% where it
+drops nav/header/footer boilerplate on purpose) and how many paragraphs it
+returns that BeautifulSoup does not (expected only where html.parser nests
+unclosed <p> tags into one). A page where the extractor finds nothing but
+BeautifulSoup finds text is flagged EMPTY.
+"""
+import argparse
+import glob
+import os
+import random
+import statistics
+import time
+from bs4 import BeautifulSoup
+from tools.extract import extractParagraphs
+
+CHUNK = 64 * 1024
+
+def syntheticCorpus(count: int = 12) -> list:
+    rng = random.Random(42)
+    words = "the market government report said people year new city court police team season world".split()
+    pages = []
+    for i in range(count):
+        paragraphs = 50 + int(20000 * (i / count) ** 2)
+        body = [
+            "<html><head><script>" + "var x = 1;" * 2000 + "</script><style>" + "p{margin:0}" * 500 + "</style></head><body>",
+            "<nav>" + "<a href='#'>link</a>" * 300 + "</nav><header><p>Subscribe now</p></header><main><article>",
+        ]
+        for _ in range(paragraphs):
+            body.append("<p>" + " ".join(rng.choice(words) for _ in range(rng.randint(20, 60))) + "</p>")
+            if rng.random() < 0.1:
+                body.append("<div class='ad'><script>ad()</script><img src='x.png'></div>")
+        body.append("</article></main><footer><p>Copyright</p></footer></body></html>")
+        pages.append((f"synthetic-{i}", "".join(body).encode()))
+    return pages
+
+def loadCorpus(directory: str) -> list:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, "rb") as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+def soupPath(raw: bytes, limit: int) -> str:
+    soup = BeautifulSoup(raw.decode("utf-8", errors="replace"), "html.parser")
+    return "\n\n".join([p.get_text() for p in soup.find_all("p")])[:limit]
+
+def streamPath(raw: bytes, limit: int) -> str:
+    chunks = (raw[i:i + CHUNK] for i in range(0, len(raw), CHUNK))
+    return extractParagraphs(chunks, limit)[0][:limit]
+
+def _paragraphs(text: str) -> list:
+    # Whitespace is ignored: BeautifulSoup drops <br> where the extractor keeps a newline
+    return ["".join(p.split()) for p in text.split("\n\n") if p.strip()]
+
+def parity(raw: bytes):
+    """(share of soup paragraphs also extracted, extracted paragraphs soup lacks) on the full page."""
+    soup = _paragraphs(soupPath(raw, None))
+    stream = _paragraphs(streamPath(raw, None))
+    found = set(stream)
+    recall = sum(p in found for p in soup) / len(soup) if soup else 1.0
+    return recall, len(set(stream) - set(soup)), bool(soup) and not stream
+
+def timeIt(fn, raw, limit, repeat) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(raw, limit)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages_dir", nargs="?", default=os.path.join(os.path.dirname(__file__), "corpus"))
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args()
+
+    pages = loadCorpus(args.pages_dir)
+    if args.synthetic or not pages:
+        pages += syntheticCorpus()
+    print(f"{'page':<28}{'KB':>8}{'soup ms':>10}{'stream ms':>11}{'speedup':>9}{'parity':>9}{'extra':>7}")
+    soup_total = stream_total = 0
+    speedups, recalls, empty = [], [], []
+    for name, raw in pages:
+        soup_ms = timeIt(soupPath, raw, args.limit, args.repeat)
+        stream_ms = timeIt(streamPath, raw, args.limit, args.repeat)
+        soup_total += soup_ms
+        stream_total += stream_ms
+        speedups.append(soup_ms / max(stream_ms, 1e-6))
+        recall, extra, missing = parity(raw)
+        recalls.append(recall)
+        if missing:
+            empty.append(name)
+        print(f"{name[:27]:<28}{len(raw) // 1024:>8}{soup_ms:>10.1f}{stream_ms:>11.2f}{speedups[-1]:>8.1f}x"
+              f"{recall:>8.0%}{extra:>7}{'  EMPTY' if missing else ''}")
+    print(f"\n{len(pages)} pages, limit={args.limit}: soup {soup_total:.0f} ms, stream {stream_total:.1f} ms, "
+          f"median speedup {statistics.median(speedups):.1f}x, median parity {statistics.median(recalls):.0%}, "
+          f"{len(empty)} empty")
+
+if __name__ == "__main__":
+    main()
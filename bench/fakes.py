@@ -0,0 +1,353 @@
+"""
+Local stand-ins for the external services, for benchmarks.
+
+Each fake is a threaded HTTP server on 127.0.0.1 with a fixed per-request
+latency; start() returns its base URL. Point the app at them through the
+environment (GROQ_BASE_URL, GOOGLE_SEARCH_URL, WIKIPEDIA_API_URL,
+SUPABASE_URL). Every fake counts its requests and the time spent serving
+them in `usage`, keyed by service name, so a benchmark can break a request
+down by upstream.
+"""
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+ANSWER = (
+    "Here is a short overview of the topic you asked about, with the main points summarised "
+    "in a few sentences so the reply is long enough to stream as ordinary text."
+)
+WORDS = "the market government report said people year new city court police team season world".split()
+
+usage = {}  # service -> {"requests", "seconds"}
+_usage_lock = threading.Lock()
+
+def snapshot() -> dict:
+    with _usage_lock:
+        return {name: dict(u) for name, u in usage.items()}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = "fake"
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _timed(self, handle):
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        try:
+            handle()
+        finally:
+            with _usage_lock:
+                u = usage.setdefault(self.service, {"requests": 0, "seconds": 0.0})
+                u["requests"] += 1
+                u["seconds"] += time.perf_counter() - start
+
+    def _query(self) -> dict:
+        return {k: v[0] for k, v in parse_qs(urlsplit(self.path).query, keep_blank_values=True).items()}
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _send(self, status: int, payload, content_type="application/json", headers=None):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+def _paragraphs(seed: str, count: int) -> list:
+    rng = int(hashlib.md5(seed.encode()).hexdigest(), 16)
+    out = []
+    for i in range(count):
+        out.append(" ".join(WORDS[(rng >> (i % 64) ^ j * 7) % len(WORDS)] for j in range(40)))
+    return out
+
+class FakeGroq(_Handler):
+    """
+    OpenAI-style chat completions with rate-limit headers; supports stream=True.
+
+    When the request offers tools and the last user message contains
+    [tool:NAME], the reply is a call to that tool with the rest of the
+    message as its query.
+    """
+
+    service = "groq"
+    RATE_HEADERS = {
+        "x-ratelimit-remaining-requests": "14000",
+        "x-ratelimit-reset-requests": "6s",
+        "x-ratelimit-remaining-tokens": "500000",
+        "x-ratelimit-reset-tokens": "1s",
+    }
+    TOOL = re.compile(r"\[tool:(\w+)\]\s*")
+
+    def do_POST(self):
+        self._timed(self._complete)
+
+    def _toolCall(self, body):
+        if not body.get("tools"):
+            return None
+        last = next((m for m in reversed(body.get("messages", [])) if m.get("role") == "user"), None)
+        match = self.TOOL.search(str(last and last.get("content") or ""))
+        if not match:
+            return None
+        query = self.TOOL.sub("", last["content"]).strip()
+        # The query goes into the tool's first parameter (query, data, url...)
+        schema = next((t["function"].get("parameters", {}) for t in body["tools"] if t["function"]["name"] == match.group(1)), {})
+        param = next(iter(schema.get("properties") or {"query": None}))
+        return {"id": "call_fake", "type": "function", "function": {"name": match.group(1), "arguments": json.dumps({param: query})}}
+
+    def _complete(self):
+        body = self._body()
+        call = self._toolCall(body)
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "")}
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": None, "tool_calls": [call]} if call else {"role": "assistant", "content": ANSWER}
+            self._send(200, dict(
+                base,
+                object="chat.completion",
+                choices=[{"index": 0, "message": message, "finish_reason": "tool_calls" if call else "stop"}],
+                usage={"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140},
+            ), headers=self.RATE_HEADERS)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in self.RATE_HEADERS.items():
+            self.send_header(name, value)
+        self.end_headers()
+        deltas = [{"tool_calls": [dict(call, index=0)]}] if call else [{"content": w + " "} for w in ANSWER.split(" ")]
+        for delta in deltas:
+            chunk = dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": delta, "finish_reason": None}
+            ])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+class FakePages(_Handler):
+    """HTML article pages of page_kb kilobytes at /page/<id>, with ETag revalidation."""
+
+    service = "pages"
+    page_kb = 200
+
+    def do_GET(self):
+        self._timed(self._page)
+
+    def _page(self):
+        etag = '"' + hashlib.md5(self.path.encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        paragraphs = _paragraphs(self.path, max(1, self.page_kb * 1024 // 300))
+        html = (
+            "<html><head><script>" + "var x = 1;" * 500 + "</script></head><body><nav>menu</nav><article>"
+            + "".join(f"<p>{p}</p>" for p in paragraphs) + "</article></body></html>"
+        )
+        self._send(200, html.encode(), "text/html; charset=utf-8", {"ETag": etag})
+
+class FakeSearch(_Handler):
+    """Google Custom Search JSON API; result links point at pages_url."""
+
+    service = "cse"
+    pages_url = ""
+
+    def do_GET(self):
+        self._timed(self._search)
+
+    def _search(self):
+        q = self._query()
+        num = int(q.get("num") or 10)
+        key = hashlib.md5(q.get("q", "").encode()).hexdigest()[:10]
+        items = [{
+            "title": f"{q.get('q', '')} result {i}",
+            "link": f"{self.pages_url}/page/{key}-{i}" + (".png" if q.get("searchType") == "image" else ""),
+            "snippet": "A result snippet.",
+        } for i in range(num)]
+        self._send(200, {"items": items})
+
+class FakeWikipedia(_Handler):
+    """MediaWiki action=query&list=search and action=parse."""
+
+    service = "wikipedia"
+
+    def do_GET(self):
+        self._timed(self._api)
+
+    def _api(self):
+        q = self._query()
+        if q.get("action") == "parse":
+            html = "".join(f"<p>{p}</p>" for p in _paragraphs(q.get("pageid", ""), 40))
+            self._send(200, {"parse": {"title": "Page", "pageid": int(q.get("pageid", 0)), "text": {"*": html}}})
+            return
+        pageid = int(hashlib.md5(q.get("srsearch", "").encode()).hexdigest()[:6], 16)
+        self._send(200, {"query": {"search": [{"pageid": pageid, "title": q.get("srsearch", "")}]}})
+
+class FakeSupabase(_Handler):
+    """
+    The slice of PostgREST (/rest/v1/<table>) the app uses: select with
+    eq/neq/lt/lte/gt/gte and or/and filters, order, limit; upsert (POST with
+    merge-duplicates), insert, PATCH and DELETE. Tables are kept in memory.
+    """
+
+    service = "supabase"
+    KEYS = {
+        "conversations": ("conversation_id",),
+        "conversation_messages": ("conversation_id", "seq"),
+        "users": ("user_id",),
+    }
+    tables = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        self._timed(lambda: self._send(200, self._select()))
+
+    def do_HEAD(self):
+        self._timed(lambda: self._send(200, b""))
+
+    def do_POST(self):
+        self._timed(self._upsert)
+
+    def do_PATCH(self):
+        self._timed(self._update)
+
+    def do_DELETE(self):
+        self._timed(self._delete)
+
+    def _table(self):
+        return urlsplit(self.path).path.rstrip("/").split("/")[-1]
+
+    def _params(self):
+        return [(k, v) for k, values in parse_qs(urlsplit(self.path).query).items() for v in values]
+
+    def _rows(self):
+        return self.tables.setdefault(self._table(), {})
+
+    def _matches(self, row) -> bool:
+        for key, value in self._params():
+            if key in ("select", "order", "limit", "offset", "columns", "on_conflict"):
+                continue
+            if key == "or":
+                if not _evalGroup("or", value[1:-1], row):
+                    return False
+            elif not _evalFilter(key, value, row):
+                return False
+        return True
+
+    def _select(self) -> list:
+        params = dict(self._params())
+        with self.lock:
+            rows = [dict(r) for r in self._rows().values() if self._matches(r)]
+        for term in reversed(params.get("order", "").split(",") if params.get("order") else []):
+            column, _, direction = term.partition(".")
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction.startswith("desc"))
+        if "limit" in params:
+            rows = rows[:int(params["limit"])]
+        columns = [c.strip() for c in params.get("select", "*").split(",")]
+        if columns != ["*"]:
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+        return rows
+
+    def _key(self, row):
+        return tuple(row.get(k) for k in self.KEYS.get(self._table(), ("id",)))
+
+    def _upsert(self):
+        body = self._body()
+        rows = body if isinstance(body, list) else [body]
+        with self.lock:
+            table = self._rows()
+            for row in rows:
+                key = self._key(row)
+                table[key] = dict(table.get(key, {}), **row)
+        self._send(201, rows)
+
+    def _update(self):
+        changes = self._body()
+        with self.lock:
+            updated = [r.update(changes) or dict(r) for r in self._rows().values() if self._matches(r)]
+        self._send(200, updated)
+
+    def _delete(self):
+        with self.lock:
+            table = self._rows()
+            doomed = [k for k, r in table.items() if self._matches(r)]
+            deleted = [table.pop(k) for k in doomed]
+        self._send(200, deleted)
+
+_OPS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+}
+
+def _coerce(value: str, like):
+    value = value[1:-1] if len(value) > 1 and value[0] == value[-1] == '"' else value
+    if isinstance(like, bool):
+        return value == "true"
+    if isinstance(like, (int, float)):
+        return type(like)(value)
+    return value
+
+def _evalFilter(column: str, expression: str, row: dict) -> bool:
+    op, _, value = expression.partition(".")
+    current = row.get(column)
+    if op not in _OPS or current is None:
+        return False
+    return _OPS[op](current, _coerce(value, current))
+
+def _split(text: str) -> list:
+    """Split on top-level commas, respecting parentheses and double quotes."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+def _evalGroup(kind: str, text: str, row: dict) -> bool:
+    results = []
+    for part in _split(text):
+        if part.startswith(("and(", "or(")):
+            inner = part[part.index("(") + 1:-1]
+            results.append(_evalGroup(part[:part.index("(")], inner, row))
+        else:
+            column, _, expression = part.partition(".")
+            results.append(_evalFilter(column, expression, row))
+    return any(results) if kind == "or" else all(results)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading early (streamed pages cut at a limit) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+def start(handler, latency: float = 0.0, **attrs) -> str:
+    """Serve handler on a free port in a daemon thread; returns the base URL."""
+    server = _Server(("127.0.0.1", 0), type(handler.__name__, (handler,), dict(attrs, latency=latency)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,217 @@
+"""
+Offline load test for the chat pipeline, history and the research tools.
+
+    python -m bench.load_bench [--scenario chat --scenario news ...] [--requests 40] [--concurrency 8]
+                               [--groq-latency 0.3] [--upstream-latency 0.05] [--supabase-latency 0.01]
+                               [--save NAME] [--compare NAME] [--tolerance 0.2]
+
+Every external service is replaced by a local fake (bench/fakes.py): Groq,
+Google CSE, Wikipedia, article pages and a PostgREST stand-in for Supabase.
+The app runs under gunicorn_config.py in a subprocess for the HTTP scenarios;
+the news and deepSearch scenarios call the tools in-process against the same
+fakes. Search/page queries are unique per request, so caches start cold.
+
+For each scenario this prints throughput and p50/p95/p99 latency, then the
+upstream calls and time per request by service. --save writes the results
+to bench/baselines/NAME.json; --compare checks them against a saved
+baseline and exits non-zero if p95 or throughput regressed by more than
+--tolerance.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bench import fakes
+from bench.serving_bench import SETUPS, freePort, startServer
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+USER = "bench"
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+def _chat(base: str, message: str, i: int):
+    response = requests.post(f"{base}/chat", data={
+        "user_id": USER, "conversation_id": f"bench-{time.time_ns()}-{i}", "message": message, "cache": "0",
+    }, timeout=300)
+    response.raise_for_status()
+    if "error" in response.json():
+        raise RuntimeError(response.json()["error"])
+
+def _chatStream(base: str, i: int):
+    """Returns the server-reported time to first token, in ms."""
+    response = requests.post(f"{base}/chat/stream", data={
+        "user_id": USER, "conversation_id": f"bench-{time.time_ns()}-{i}", "message": f"Tell me something {i}", "cache": "0",
+    }, stream=True, timeout=300)
+    response.raise_for_status()
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[7:]
+        elif line.startswith("data: ") and event in ("done", "error"):
+            data = json.loads(line[6:])
+            if event == "error":
+                raise RuntimeError(data.get("message"))
+            return data.get("ttft_ms")
+    raise RuntimeError("stream ended without done")
+
+def _history(base: str, i: int):
+    response = requests.get(f"{base}/history", params={"user_id": USER, "limit": 50}, timeout=60)
+    response.raise_for_status()
+
+def _news(base: str, i: int):
+    from tools.news import main
+    main(f"latest news on topic {i} {time.time_ns()}")
+
+def _deepSearch(base: str, i: int):
+    from tools.deepSearch import ai_agent_generate_report
+    ai_agent_generate_report(f"research topic {i} {time.time_ns()}")
+
+SCENARIOS = {
+    "chat": lambda base, i: _chat(base, f"What is the capital of place {i}?", i),
+    "chat_stream": _chatStream,
+    "chat_news": lambda base, i: _chat(base, f"[tool:newsFinder] news about event {i} {time.time_ns()}", i),
+    "chat_wiki": lambda base, i: _chat(base, f"[tool:WikipediaSearch] person {i} {time.time_ns()}", i),
+    "history": _history,
+    "news": _news,
+    "deepsearch": _deepSearch,
+}
+
+def runScenario(name: str, base: str, total: int, concurrency: int) -> dict:
+    latencies, errors, ttfts = [], [], []
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            extra = SCENARIOS[name](base, i)
+        except Exception as e:
+            errors.append(str(e))
+            return
+        latencies.append(time.perf_counter() - start)
+        if extra is not None:
+            ttfts.append(extra)
+
+    before = fakes.snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    after = fakes.snapshot()
+
+    stages = {}
+    for service, u in after.items():
+        calls = u["requests"] - before.get(service, {}).get("requests", 0)
+        if calls:
+            seconds = u["seconds"] - before.get(service, {}).get("seconds", 0.0)
+            stages[service] = {"calls_per_request": round(calls / total, 2), "ms_per_request": round(seconds * 1000 / total, 1)}
+    result = {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "throughput": round(len(latencies) / elapsed, 2),
+        "stages": stages,
+    }
+    if latencies:
+        result.update({f"p{p}_ms": round(percentile(latencies, p) * 1000, 1) for p in (50, 95, 99)})
+    if ttfts:
+        result["ttft_p50_ms"] = percentile(ttfts, 50)
+    if errors:
+        print(f"  {name}: {len(errors)} errors, first: {errors[0]}")
+    return result
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    print(f"\n{'scenario':<14}{'p95 ms':>10}{'base':>10}{'req/s':>9}{'base':>9}")
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b or "p95_ms" not in r or "p95_ms" not in b:
+            continue
+        flags = []
+        if r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            flags.append("p95")
+        if r["throughput"] < b["throughput"] * (1 - tolerance):
+            flags.append("throughput")
+        print(f"{name:<14}{r['p95_ms']:>10.0f}{b['p95_ms']:>10.0f}{r['throughput']:>9.1f}{b['throughput']:>9.1f}"
+              f"  {'REGRESSED: ' + ', '.join(flags) if flags else 'ok'}")
+        if flags:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="default: all")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--groq-latency", type=float, default=0.3)
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="CSE, Wikipedia and page servers")
+    parser.add_argument("--supabase-latency", type=float, default=0.01)
+    parser.add_argument("--page-kb", type=int, default=200)
+    parser.add_argument("--persistence", default="delta", choices=["array", "delta", "sqlite"])
+    parser.add_argument("--setup", default="gunicorn gthread", choices=list(SETUPS))
+    parser.add_argument("--save", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    pages = fakes.start(fakes.FakePages, args.upstream_latency, page_kb=args.page_kb)
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    os.environ.update(
+        GROQ_BASE_URL=fakes.start(fakes.FakeGroq, args.groq_latency),
+        GROQ_API_KEY="bench",
+        GOOGLE_SEARCH_URL=fakes.start(fakes.FakeSearch, args.upstream_latency, pages_url=pages) + "/customsearch/v1",
+        WIKIPEDIA_API_URL=fakes.start(fakes.FakeWikipedia, args.upstream_latency) + "/w/api.php",
+        SUPABASE_URL=fakes.start(fakes.FakeSupabase, args.supabase_latency),
+        SUPABASE_KEY="bench",
+        PERSISTENCE_MODE=args.persistence,
+        SQLITE_DB_PATH=os.path.join(workdir, "conversations.sqlite"),
+        SEARCH_INDEX_PATH=os.path.join(workdir, "search.sqlite"),
+        RAG_INDEX_DIR=os.path.join(workdir, "rag"),
+        PAGE_CACHE_DIR="",
+    )
+    names = args.scenario or list(SCENARIOS)
+    print(f"{args.requests} requests per scenario, {args.concurrency} concurrent; latency groq "
+          f"{args.groq_latency * 1000:.0f} ms, upstream {args.upstream_latency * 1000:.0f} ms, "
+          f"supabase {args.supabase_latency * 1000:.0f} ms; {args.setup}, {args.persistence} persistence\n")
+
+    port = freePort()
+    server = startServer(SETUPS[args.setup], port, dict(os.environ))
+    results = {}
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _chat(base, "warm up", -1)
+        print(f"{'scenario':<14}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}  per request")
+        for name in names:
+            r = results[name] = runScenario(name, base, args.requests, args.concurrency)
+            stages = ", ".join(f"{s} {v['calls_per_request']:g}x {v['ms_per_request']:.0f}ms" for s, v in r["stages"].items())
+            if "ttft_p50_ms" in r:
+                stages += f", ttft p50 {r['ttft_p50_ms']}ms"
+            print(f"{name:<14}{r['throughput']:>8.1f}{r.get('p50_ms', 0):>9.0f}{r.get('p95_ms', 0):>9.0f}"
+                  f"{r.get('p99_ms', 0):>9.0f}{r['errors']:>8}  {stages}")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        config = {k: v for k, v in vars(args).items() if k not in ("save", "compare", "scenario")}
+        with open(path, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"\nSaved baseline {path}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = json.load(f)
+        if compare(results, baseline["results"], args.tolerance):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Concurrent /chat throughput under the different serving setups.
+
+    python -m bench.serving_bench [--requests 64] [--concurrency 16] [--latency 0.5]
+
+Each setup is started as a subprocess against a fake Groq server with a fixed
+response latency (bench/fakes.py), sqlite persistence and an unreachable
+Supabase, then sent --requests /chat calls from --concurrency clients.
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bench import fakes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUPS = {
+    # What production ran before: one sync worker
+    "gunicorn sync x1": ["gunicorn", "-c", "gunicorn_config.py", "--worker-class", "sync", "--workers", "1", "--threads", "1"],
+    "gunicorn gthread": ["gunicorn", "-c", "gunicorn_config.py"],
+    "uvicorn asgi": ["uvicorn", "asgi:application", "--workers", "1", "--no-access-log"],
+}
+
+def freePort() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def startServer(command: list, port: int, env: dict) -> subprocess.Popen:
+    if command[0] == "gunicorn":
+        command = command + ["--bind", f"127.0.0.1:{port}", "app:app"]
+    else:
+        command = command + ["--host", "127.0.0.1", "--port", str(port)]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/stats", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{' '.join(command)} did not start")
+
+def chat(port: int, i: int) -> float:
+    start = time.perf_counter()
+    response = requests.post(
+        f"http://127.0.0.1:{port}/chat",
+        data={"user_id": "bench", "conversation_id": f"bench-{i}-{time.time_ns()}", "message": "What is new?"},
+        timeout=300,
+    )
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+def run(port: int, total: int, concurrency: int):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(pool.map(lambda i: chat(port, i), range(total)))
+    elapsed = time.perf_counter() - start
+    return total / elapsed, latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake Groq response time, seconds")
+    parser.add_argument("--setup", action="append", choices=list(SETUPS), help="run only these setups")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="serving-bench-")
+    env = dict(
+        os.environ,
+        GROQ_BASE_URL=fakes.start(fakes.FakeGroq, args.latency),
+        GROQ_API_KEY="bench",
+        SUPABASE_URL="http://127.0.0.1:9",
+        SUPABASE_KEY="bench",
+        PERSISTENCE_MODE="sqlite",
+        SQLITE_DB_PATH=os.path.join(workdir, "conversations.sqlite"),
+        SEARCH_INDEX_PATH=os.path.join(workdir, "search.sqlite"),
+        RAG_INDEX_DIR=os.path.join(workdir, "rag"),
+    )
+    print(f"{args.requests} requests, {args.concurrency} concurrent, Groq latency {args.latency * 1000:.0f} ms\n")
+    print(f"{'setup':<20}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    try:
+        for name in args.setup or SETUPS:
+            port = freePort()
+            process = startServer(SETUPS[name], port, env)
+            try:
+                chat(port, -1)  # warm up
+                throughput, latencies = run(port, args.requests, args.concurrency)
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"{name:<20}{throughput:>8.1f}{statistics.median(latencies) * 1000:>9.0f}"
+                  f"{p95 * 1000:>9.0f}{latencies[-1] * 1000:>9.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,7 @@ function SidebarComponent() {
     useMessageStore();
 
   const [history, setHistory] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [hover, setHover] = useState(false);
   const pingRAG = async () => {
@@ -29,16 +30,32 @@ function SidebarComponent() {
     try {
       const url = `${import.meta.env.VITE_URL}/history`;
       const response = await axios.get(url);
-      setHistory(response.data);
+      setHistory(response.data.conversations);
+      setNextCursor(response.data.next_cursor);
       // console.log(response.data);
     } catch (error) {
       console.error(error);
     }
   };
-  const loadChatHistory = (data) => {
-    // console.log(data.messages);
-    setConversationId(data.conversation_id);
-    loadMessage(data.messages);
+  const loadMoreHistory = async () => {
+    try {
+      const url = `${import.meta.env.VITE_URL}/history`;
+      const response = await axios.get(url, { params: { cursor: nextCursor } });
+      setHistory((items) => [...items, ...response.data.conversations]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error(error);
+    }
+  };
+  const loadChatHistory = async (data) => {
+    try {
+      const url = `${import.meta.env.VITE_URL}/history/${data.conversation_id}`;
+      const response = await axios.get(url);
+      setConversationId(data.conversation_id);
+      loadMessage(response.data);
+    } catch (error) {
+      console.error(error);
+    }
   };
   const handleDelete = async (id) => {
     try {
@@ -61,6 +78,7 @@ function SidebarComponent() {
     try {
       await axios.delete(`${import.meta.env.VITE_URL}/delete`).then(() => {
         setHistory([]);
+        setNextCursor(null);
       });
       handleNewChat();
     } catch (error) {
@@ -113,11 +131,9 @@ function SidebarComponent() {
           <Loader2 className="w-8 h-8 animate-spin" />
         </div>
       ) : (
-        <div className="flex flex-col gap-2 h-[63vh] overflow-hidden">
+        <div className="flex flex-col gap-2 h-[63vh] overflow-y-auto">
           {/* history is not a array */}
           {history
-            .slice()
-            .reverse()
             .map((item, index) => (
               <div key={index} className="flex gap-2 items-center">
                 <Button
@@ -125,7 +141,7 @@ function SidebarComponent() {
                   variant="ghost"
                   className="w-full flex flex-col items-start ps-2 truncate"
                 >
-                  {item.messages[1].content}
+                  {item.title}
                 </Button>
                 <Button
                   size="icon"
@@ -141,6 +157,11 @@ function SidebarComponent() {
                 </Button>
               </div>
             ))}
+          {nextCursor && (
+            <Button variant="ghost" className="rounded-3xl" onClick={() => loadMoreHistory()}>
+              Load more
+            </Button>
+          )}
         </div>
       )}
       <div className="flex flex-col gap-2 justify-between">
@@ -1,2 +1,18 @@
+import os
+
 bind = "0.0.0.0:5000"
-# workers = 4  # Number of worker processes
\ No newline at end of file
+# One process with a thread per in-flight request by default. Conversations
+# live in process memory unless STATE_BACKEND=redis shares them (see
+# utils/sharedState.py); only then raise GUNICORN_WORKERS. Caches stay per
+# worker. Scale with threads (see bench/serving_bench.py).
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+# deepSearch and code execution can run for a minute
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+keepalive = 5
+
+def worker_exit(server, worker):
+    # Write out conversations still queued in the write-behind buffer
+    from utils.db import flush_pending_writes
+    flush_pending_writes()
@@ -0,0 +1,27 @@
+-- Summary columns used by the /history listing (utils/persistence.py).
+-- Run once against Supabase before deploying; safe to re-run.
+
+alter table conversations add column if not exists title text not null default '';
+alter table conversations add column if not exists message_count integer not null default 0;
+alter table conversations add column if not exists updated_at timestamptz;
+
+-- Backfill rows written before these columns existed (array mode keeps the whole messages array)
+update conversations c set
+    message_count = coalesce(jsonb_array_length(c.messages), 0),
+    title = coalesce(left((
+        select m.value->>'content'
+        from jsonb_array_elements(c.messages) with ordinality as m(value, idx)
+        where m.value->>'role' = 'user'
+        order by m.idx
+        limit 1
+    ), 80), ''),
+    updated_at = now()
+where c.updated_at is null and c.messages is not null;
+
+update conversations set updated_at = now() where updated_at is null;
+
+alter table conversations alter column updated_at set default now();
+alter table conversations alter column updated_at set not null;
+
+create index if not exists conversations_user_updated
+    on conversations (user_id, updated_at desc, conversation_id desc);
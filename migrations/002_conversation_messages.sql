@@ -0,0 +1,22 @@
+-- Message rows used by PERSISTENCE_MODE=delta (utils/persistence.py).
+-- Run once against Supabase after 001 and before deploying delta mode; safe to re-run.
+
+create table if not exists conversation_messages (
+    conversation_id text not null,
+    user_id text not null,
+    seq integer not null,
+    message jsonb not null,
+    primary key (conversation_id, seq)
+);
+
+create index if not exists conversation_messages_user on conversation_messages (user_id);
+
+-- Delta mode upserts header rows without a messages array
+alter table conversations alter column messages drop not null;
+
+-- Copy conversations saved in array mode so they still load after switching
+insert into conversation_messages (conversation_id, user_id, seq, message)
+select c.conversation_id, c.user_id, m.idx - 1, m.value
+from conversations c, jsonb_array_elements(c.messages) with ordinality as m(value, idx)
+where c.messages is not null
+on conflict (conversation_id, seq) do nothing;
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Modules read these at import time; the tests never reach the real services
+_tmp = tempfile.mkdtemp(prefix="luna-tests-")
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("WRITE_BEHIND", "0")
+os.environ.setdefault("PERSISTENCE_MODE", "sqlite")
+os.environ.setdefault("SQLITE_DB_PATH", os.path.join(_tmp, "conversations.sqlite"))
+os.environ.setdefault("SEARCH_INDEX_PATH", os.path.join(_tmp, "search.sqlite"))
+os.environ.setdefault("RAG_INDEX_DIR", os.path.join(_tmp, "rag"))
+os.environ.setdefault("BLOB_DIR", os.path.join(_tmp, "blobs"))
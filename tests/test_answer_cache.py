@@ -0,0 +1,21 @@
+import pytest
+from utils import answerCache
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    answerCache._entries.clear()
+    answerCache._buckets.clear()
+
+def test_near_duplicate_question_hits():
+    answerCache.store("what is the weather in paris today", "prompt", "Sunny")
+    near_hits = answerCache.stats()["near_hits"]
+    assert answerCache.lookup("please tell me what is the weather in paris today?", "prompt") == "Sunny"
+    assert answerCache.stats()["near_hits"] == near_hits + 1
+    assert answerCache.lookup("what is the weather in paris today", "other prompt") is None
+
+def test_reordered_question_misses():
+    answerCache.store("convert 100 usd to inr", "prompt", "8,300 INR")
+    answerCache.store("is python faster than java", "prompt", "Usually not")
+    assert answerCache.lookup("convert 100 inr to usd", "prompt") is None
+    assert answerCache.lookup("is java faster than python", "prompt") is None
+    assert answerCache.lookup("convert 100 usd to inr", "prompt") == "8,300 INR"
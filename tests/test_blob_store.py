@@ -0,0 +1,22 @@
+import importlib
+import os
+
+def test_blob_dir_is_absolute_and_independent_of_cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("BLOB_DIR", "blobs")
+    from utils import blobStore
+    blobStore = importlib.reload(blobStore)
+    name = blobStore.put(b"png bytes", ".png")
+    monkeypatch.chdir("/")
+    path = blobStore.path(name)
+    assert os.path.isabs(path) and open(path, "rb").read() == b"png bytes"
+
+def test_derived_blobs_are_made_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("BLOB_DIR", str(tmp_path))
+    from utils import blobStore
+    blobStore = importlib.reload(blobStore)
+    calls = []
+    make = lambda: calls.append(1) or b"qr"
+    first = blobStore.putDerived("qr:hello", make, ".png")
+    assert blobStore.putDerived("qr:hello", make, ".png") == first
+    assert len(calls) == 1
@@ -0,0 +1,12 @@
+from utils import context
+
+def test_token_cache_holds_no_message_bodies():
+    body = "page text " * 5000
+    context.countTokens({"role": "tool", "content": body})
+    assert all(body not in map(str, key) for key in context._token_counts._data)
+
+def test_token_counts_are_cached_by_content():
+    message = {"role": "user", "content": "hello there"}
+    first = context.countTokens(message)
+    assert context.countTokens(dict(message)) == first
+    assert context.countTokens({"role": "user", "content": "hello there again"}) != first
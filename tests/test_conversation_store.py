@@ -0,0 +1,26 @@
+from utils.conversationStore import ConversationStore
+
+def _store(**kwargs):
+    persisted = {cid: [{"role": "system", "content": cid}] for cid in ("a", "b", "c")}
+    return ConversationStore(loader=lambda cid, user_id: [dict(m) for m in persisted[cid]], **kwargs)
+
+def test_least_recently_used_is_evicted_and_reloaded():
+    store = _store(max_entries=2)
+    for cid in ("a", "b", "c"):
+        store.load(cid, "user")
+    assert "a" not in store and store.evictions == 1
+    assert store["a"] == [{"role": "system", "content": "a"}] and store.reloads == 4
+
+def test_conversation_is_not_evicted_mid_turn():
+    store = _store(max_entries=2)
+    store.load("a", "user")
+    with store.lock("a"):
+        store["a"].append({"role": "user", "content": "question"})
+        store.touch("a")
+        store.load("b", "user")
+        store.load("c", "user")
+        store["a"].append({"role": "tool", "content": "result"})
+        assert [m["role"] for m in store["a"]] == ["system", "user", "tool"]
+        assert store.stats()["pinned"] == 1
+    # Unpinned again, so the store shrinks back to its limit
+    assert len(store) == 2 and store.stats()["pinned"] == 0
@@ -0,0 +1,24 @@
+import os
+from bench.extract_bench import loadCorpus, parity
+from tools.extract import extractHtml, extractParagraphs
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "bench", "corpus")
+
+def test_form_wrapped_page_is_extracted():
+    assert extractHtml("<form><div><p>Main article text here.</p></div></form>") == "Main article text here."
+
+def test_boilerplate_is_skipped():
+    html = "<nav><p>Menu</p></nav><article><p>Body</p></article><footer><p>Copyright</p></footer>"
+    assert extractHtml(html) == "Body"
+
+def test_stops_at_limit():
+    text, complete = extractParagraphs([b"<p>" + b"word " * 100 + b"</p><p>second</p>"], limit=50)
+    assert not complete and "second" not in text
+
+def test_corpus_matches_beautifulsoup():
+    pages = loadCorpus(CORPUS)
+    assert pages
+    for name, raw in pages:
+        recall, extra, empty = parity(raw)
+        assert not empty, name
+        assert recall >= 0.5, name
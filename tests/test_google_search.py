@@ -0,0 +1,44 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from tools import googleSearch
+from utils.cache import TTLCache
+
+@pytest.fixture
+def fetches(monkeypatch):
+    monkeypatch.setattr(googleSearch, "_cache", TTLCache(maxsize=16, ttl=60))
+    stub = SimpleNamespace(calls=[], release=threading.Event())
+    stub.release.set()
+    def fetch(query, num, searchType, gl):
+        stub.calls.append((query, num))
+        stub.release.wait(5)
+        return {"items": [{"link": f"https://example.com/{i}"} for i in range(num)]}
+    monkeypatch.setattr(googleSearch, "_fetch", fetch)
+    return stub
+
+def test_smaller_num_is_served_from_larger_cached_result(fetches):
+    assert len(googleSearch.search("Volcanoes", num=10)["items"]) == 10
+    assert len(googleSearch.search("  volcanoes ", num=3)["items"]) == 3
+    assert fetches.calls == [("Volcanoes", 10)]
+    # A larger request than the cached one goes out again
+    googleSearch.search("volcanoes", num=10, searchType="image")
+    assert len(fetches.calls) == 2
+
+def test_identical_requests_in_flight_are_coalesced(fetches):
+    fetches.release.clear()
+    coalesced = googleSearch.stats()["coalesced"]
+    results = {}
+    leader = threading.Thread(target=lambda: results.setdefault("leader", googleSearch.search("eclipse", num=10)))
+    leader.start()
+    while not fetches.calls:
+        time.sleep(0.01)
+    follower = threading.Thread(target=lambda: results.setdefault("follower", googleSearch.search("Eclipse", num=5)))
+    follower.start()
+    while googleSearch.stats()["coalesced"] == coalesced:
+        time.sleep(0.01)
+    fetches.release.set()
+    leader.join(5)
+    follower.join(5)
+    assert fetches.calls == [("eclipse", 10)]
+    assert len(results["leader"]["items"]) == 10 and len(results["follower"]["items"]) == 5
@@ -0,0 +1,94 @@
+import json
+import time
+import pytest
+from bench import fakes
+from utils import groqPool
+from utils.groqPool import GroqPool
+
+MODEL = "llama-3.3-70b-versatile"
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+class ScriptedGroq(fakes.FakeGroq):
+    """FakeGroq that first plays a per-key script of failures: 429, 500 or reset."""
+
+    scripts = {}
+
+    def do_POST(self):
+        key = self.headers.get("Authorization", "").split(" ")[-1]
+        script = self.scripts.get(key)
+        action = script.pop(0) if script else None
+        if action is None:
+            return super().do_POST()
+        self._body()
+        if action == "reset":
+            self.close_connection = True
+            self.connection.close()
+        elif action == "429":
+            self._send(429, {"error": {"message": "rate limited"}}, headers={"retry-after": "30"})
+        else:
+            self._send(int(action), {"error": {"message": "upstream error"}})
+
+@pytest.fixture
+def groq(monkeypatch):
+    ScriptedGroq.scripts = {}
+    monkeypatch.setenv("GROQ_BASE_URL", fakes.start(ScriptedGroq))
+    monkeypatch.setattr(groqPool, "TRANSIENT_BACKOFF", 0.01)
+    return ScriptedGroq.scripts
+
+def _key(pool, name):
+    return next(k for k in pool.stats()["keys"] if k["key"] == "..." + name[-4:])
+
+def test_rate_limited_key_fails_over(groq):
+    groq["keyA"] = ["429"] * 10
+    pool = GroqPool(["keyA", "keyB"])
+    for _ in range(3):
+        assert pool.create(model=MODEL, messages=MESSAGES).choices[0].message.content == fakes.ANSWER
+    a, b = _key(pool, "keyA"), _key(pool, "keyB")
+    assert a["rate_limited"] == 1
+    assert a["models"][MODEL]["cooldown"] >= 29
+    assert b["requests"] == 3
+    assert pool.stats()["retries"] == 1
+
+def test_rate_limit_headers_update_the_bucket(groq):
+    pool = GroqPool(["keyA"])
+    pool.create(model=MODEL, messages=MESSAGES)
+    bucket = _key(pool, "keyA")["models"][MODEL]
+    assert bucket["remaining_requests"] == 14000
+    assert bucket["remaining_tokens"] == 500000
+
+@pytest.mark.parametrize("value, seconds", [("7.66s", 7.66), ("2m59.56s", 179.56), ("120ms", 0.12), ("1h", 3600), ("3", 3.0), (None, None)])
+def test_reset_durations(value, seconds):
+    assert groqPool._seconds(value) == pytest.approx(seconds) if seconds is not None else groqPool._seconds(value) is None
+
+def test_queue_times_out_when_every_key_is_cooling_down(groq, monkeypatch):
+    monkeypatch.setattr(groqPool, "GROQ_QUEUE_TIMEOUT", 0.5)
+    groq["keyA"] = ["429"] * 10
+    pool = GroqPool(["keyA"])
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.create(model=MODEL, messages=MESSAGES)
+    # The 30s Retry-After is past the deadline, so it fails fast instead of waiting
+    assert time.monotonic() - started < 0.5
+    assert pool.stats()["queue_timeouts"] == 1
+
+@pytest.mark.parametrize("failures", [["500"], ["503", "502"], ["reset"], ["408"]])
+def test_transient_errors_are_retried(groq, failures):
+    groq["keyA"] = list(failures)
+    pool = GroqPool(["keyA"])
+    assert pool.create(model=MODEL, messages=MESSAGES).choices[0].message.content == fakes.ANSWER
+    assert pool.stats()["transient_retries"] == len(failures)
+
+def test_client_errors_are_not_retried(groq):
+    groq["keyA"] = ["400"]
+    pool = GroqPool(["keyA"])
+    with pytest.raises(Exception) as error:
+        pool.create(model=MODEL, messages=MESSAGES)
+    assert getattr(error.value, "status_code", None) == 400
+    assert pool.stats()["transient_retries"] == 0
+
+def test_streaming(groq):
+    pool = GroqPool(["keyA"])
+    stream = pool.create(model=MODEL, messages=MESSAGES, stream=True)
+    text = "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+    assert text.strip() == fakes.ANSWER
+    assert _key(pool, "keyA")["inflight"] == 0
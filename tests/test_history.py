@@ -0,0 +1,21 @@
+import pytest
+from utils.persistence import SQLiteBackend, InvalidCursor, decodeCursor
+
+def test_pagination_walks_every_conversation(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "c.sqlite"))
+    for i in range(7):
+        backend.save(f"c{i}", "u", [{"role": "user", "content": f"question {i}"}])
+    seen, cursor = [], None
+    while True:
+        page = backend.list("u", limit=3, cursor=cursor)
+        seen += [row["conversation_id"] for row in page["conversations"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == [f"c{i}" for i in range(7)]
+    assert len(seen) == len(set(seen))
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bnVsbA==", "WzFd"])
+def test_malformed_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decodeCursor(cursor)
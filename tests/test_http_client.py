@@ -0,0 +1,37 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tools import httpClient
+
+class RateLimited(BaseHTTPRequestHandler):
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        if type(self).calls == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "3600")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+def test_retry_after_is_capped(monkeypatch):
+    monkeypatch.setattr(httpClient, "MAX_RETRY_AFTER", 0.2)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimited)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        started = time.monotonic()
+        response = httpClient.get(f"http://127.0.0.1:{server.server_port}/")
+        elapsed = time.monotonic() - started
+    finally:
+        server.shutdown()
+    assert response.status_code == 200 and response.content == b"ok"
+    assert RateLimited.calls == 2
+    assert 0.2 <= elapsed < 2
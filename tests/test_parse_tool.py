@@ -0,0 +1,26 @@
+import json
+import pytest
+from tools import parseTool
+
+def _args(tool_calls):
+    return json.loads(tool_calls[0].function.arguments)
+
+def test_pseudo_call_is_routed_locally():
+    tool_calls, sure = parseTool.route("<function=newsFinder{'query': 'HMPV virus in India', 'extra': 1}>")
+    assert sure and tool_calls[0].function.name == "newsFinder"
+    assert _args(tool_calls) == {"query": "HMPV virus in India"}
+
+@pytest.mark.parametrize("args", [
+    '{["a"]: 1}',
+    "{'query': " + "[" * 10000 + "]" * 10000 + "}",
+    '{"query": {"nested": "dict"}}',
+    '{"query": "   "}',
+    '{"query": 5}',
+    '{}',
+])
+def test_unreadable_or_invalid_arguments_go_to_the_llm_router(args):
+    assert parseTool.route(f"<function=webSearch{args}>") == (None, False)
+
+def test_bad_arguments_do_not_escape_get_tool(monkeypatch):
+    monkeypatch.setattr(parseTool, "_llmTool", lambda msg: None)
+    assert parseTool.get_tool('<function=webSearch{["a"]: 1}>') is None
@@ -0,0 +1,33 @@
+from utils.persistence import SQLiteBackend
+
+def _messages(n, tag="m"):
+    return [{"role": "user" if i % 2 else "assistant", "content": f"{tag}{i}"} for i in range(n)]
+
+def test_sqlite_round_trip(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "c.sqlite"))
+    backend.save("c1", "u", _messages(5))
+    assert backend.load("c1", "u") == _messages(5)
+    backend.truncate("c1", "u", 2, _messages(5))
+    assert backend.load("c1", "u") == _messages(2)
+
+def test_stale_count_from_another_worker(tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    a, b = SQLiteBackend(path), SQLiteBackend(path)
+    a.save("c1", "u", _messages(10))
+    b.load("c1", "u")
+    b.truncate("c1", "u", 4, _messages(10))
+    b.save("c1", "u", _messages(6, "b"))
+    # a still believes 10 rows are stored
+    a.save("c1", "u", _messages(8, "a"))
+    stored = SQLiteBackend(path).load("c1", "u")
+    assert len(stored) == 8
+    assert stored[6:] == _messages(8, "a")[6:]
+
+def test_stale_count_equal_length(tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    a, b = SQLiteBackend(path), SQLiteBackend(path)
+    a.save("c1", "u", _messages(6))
+    b.load("c1", "u")
+    b.truncate("c1", "u", 2, _messages(6))
+    a.save("c1", "u", _messages(4))
+    assert len(SQLiteBackend(path).load("c1", "u")) == 4
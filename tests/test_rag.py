@@ -0,0 +1,66 @@
+import io
+import os
+import threading
+import time
+from werkzeug.datastructures import FileStorage
+from utils import rag
+
+def _wait(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while rag.job(job_id)["status"] in ("queued", "indexing") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return rag.job(job_id)["status"]
+
+def _upload(user_id, text, name="notes.txt"):
+    return rag.ingest(user_id, FileStorage(stream=io.BytesIO(text.encode()), filename=name))
+
+def test_ingest_and_retrieve():
+    job_id = _upload("rag-basic", "Luna keeps uploaded documents per user.\n\nThe moon orbits the earth.")
+    assert _wait(job_id) == "done"
+    assert rag.hasContext("rag-basic")
+    assert rag.retrieve("rag-basic", "moon orbits earth", k=1)
+
+def test_remove_context_does_not_wait_for_ingestion(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    embed = rag.embed
+    def slowEmbed(texts):
+        started.set()
+        release.wait(5)
+        return embed(texts)
+    monkeypatch.setattr(rag, "embed", slowEmbed)
+
+    job_id = _upload("rag-cancel", "A long document. " * 2000)
+    assert started.wait(5)
+    begun = time.monotonic()
+    rag.removeContext("rag-cancel")
+    assert time.monotonic() - begun < 0.5
+    release.set()
+
+    assert _wait(job_id) == "cancelled"
+    assert not rag.hasContext("rag-cancel")
+
+def test_remove_context_cancels_queued_upload(monkeypatch):
+    held = []
+    class HeldPool:
+        def submit(self, func, *args):
+            held.append(args)
+    monkeypatch.setattr(rag, "_ingest_pool", HeldPool())
+    job_id = _upload("rag-queued", "Queued before the chat was cleared.")
+    rag.removeContext("rag-queued")
+    rag._ingest(*held[0])
+    assert rag.job(job_id)["status"] == "cancelled"
+    assert not rag.hasContext("rag-queued")
+
+def test_user_ids_cannot_escape_the_index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "RAG_INDEX_DIR", str(tmp_path / "rag"))
+    (tmp_path / "keep.txt").write_text("app file")
+    root = os.path.realpath(rag.RAG_INDEX_DIR)
+    for user_id in ("..", ".", "../..", "/", "a/../.."):
+        directory = os.path.realpath(rag._userDir(user_id))
+        assert os.path.dirname(directory) == root and directory != root
+    job_id = _upload(".", "Written inside the index directory.")
+    assert _wait(job_id) == "done"
+    rag.removeContext("..")
+    rag.removeContext(".")
+    assert (tmp_path / "keep.txt").read_text() == "app file"
+    assert not rag.hasContext(".")
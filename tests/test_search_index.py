@@ -0,0 +1,41 @@
+from utils.searchIndex import SearchIndex
+
+def _index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite"))
+    index.update("c1", "alice", [
+        {"role": "system", "content": "system prompt"},
+        {"role": "user", "content": "How do volcanoes form?"},
+        {"role": "assistant", "content": "Magma rises through the crust."},
+    ])
+    index.update("c2", "bob", [{"role": "user", "content": "volcanoes in Iceland"}])
+    return index
+
+def test_terms_match_content_only(tmp_path):
+    assert _index(tmp_path).search("alice", "alice") == []
+
+def test_search_is_scoped_to_the_user(tmp_path):
+    results = _index(tmp_path).search("alice", "volcanoes")
+    assert [(r["conversation_id"], r["message_index"]) for r in results] == [("c1", 1)]
+
+def test_truncation_removes_indexed_messages(tmp_path):
+    index = _index(tmp_path)
+    index.update("c1", "alice", [{"role": "system", "content": "system prompt"}, {"role": "user", "content": "How do volcanoes form?"}])
+    assert index.search("alice", "magma") == []
+
+def test_deletes_go_by_rowid(tmp_path):
+    index = _index(tmp_path)
+    statements = []
+    index._db.set_trace_callback(statements.append)
+    index.delete("c1")
+    index._db.set_trace_callback(None)
+    assert not any("FROM messages WHERE conversation_id" in s for s in statements)
+    assert index.search("alice", "volcanoes") == [] and index.search("bob", "volcanoes")
+    assert index._db.execute("SELECT COUNT(*) FROM message_rows").fetchone()[0] == 1
+
+def test_existing_index_is_backfilled(tmp_path):
+    index = _index(tmp_path)
+    index._db.execute("DROP TABLE message_rows")
+    index._db.commit()
+    index = SearchIndex(str(tmp_path / "search.sqlite"))
+    index.update("c1", "alice", [{"role": "system", "content": "system prompt"}])
+    assert index.search("alice", "volcanoes") == []
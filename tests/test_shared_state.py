@@ -0,0 +1,95 @@
+import threading
+import pytest
+from utils import db
+from utils.conversationStore import ConversationStore
+from utils.sharedState import KeyedLock, LocalState, LockTimeout, StateConflict
+
+SYSTEM = {"role": "system", "content": "prompt"}
+
+def _workers():
+    """Two stores sharing one backend, as two gunicorn workers would."""
+    shared = LocalState()
+    loader = lambda cid, user_id: None
+    return shared, ConversationStore(loader=loader, shared=shared), ConversationStore(loader=loader, shared=shared)
+
+def test_stale_publish_conflicts_and_drops_resident_copy():
+    shared, a, b = _workers()
+    a["c"] = [SYSTEM]
+    a.publish("c", "u")
+    assert b.load("c", "u") == [SYSTEM]
+    a["c"].append({"role": "user", "content": "from a"})
+    a.publish("c", "u")
+    b["c"].append({"role": "user", "content": "from b"})
+    with pytest.raises(StateConflict):
+        b.publish("c", "u")
+    assert "c" not in b and b.stats()["conflicts"] == 1
+    assert shared.get("c")[2][-1]["content"] == "from a"
+
+def test_load_refreshes_to_newer_version():
+    shared, a, b = _workers()
+    a["c"] = [SYSTEM]
+    a.publish("c", "u")
+    b.load("c", "u")
+    a["c"].append({"role": "user", "content": "newer"})
+    a.publish("c", "u")
+    assert b.load("c", "u")[-1]["content"] == "newer"
+    assert b.stats()["refreshes"] == 2
+    # Publishing from the refreshed copy is not a conflict
+    b["c"].append({"role": "assistant", "content": "reply"})
+    b.publish("c", "u")
+    assert shared.version("c") == 3
+
+def test_keyed_lock_times_out():
+    lock = KeyedLock()
+    held, release = threading.Event(), threading.Event()
+    def hold():
+        with lock("c", 1):
+            held.set()
+            release.wait(5)
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    try:
+        with pytest.raises(LockTimeout):
+            with lock("c", 0.05):
+                pass
+        with lock("other", 0.05):
+            pass
+    finally:
+        release.set()
+        thread.join()
+    with lock("c", 0.05):
+        pass
+
+def test_busy_conversation_returns_409(monkeypatch):
+    from app import app
+    monkeypatch.setattr(db.conversations, "lock_timeout", 0.05)
+    held, release = threading.Event(), threading.Event()
+    def hold():
+        with db.conversations.lock("busy"):
+            held.set()
+            release.wait(5)
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    try:
+        response = app.test_client().post("/chat", data={"conversation_id": "busy", "message": "hi"})
+    finally:
+        release.set()
+        thread.join()
+    assert response.status_code == 409
+
+def test_write_persists_newest_shared_copy(monkeypatch):
+    shared = LocalState()
+    saved = []
+    class Backend:
+        def save(self, conversation_id, user_id, messages):
+            saved.append(messages)
+    monkeypatch.setattr(db, "shared", shared)
+    monkeypatch.setattr(db, "backend", Backend())
+    older = [SYSTEM, {"role": "user", "content": "first"}]
+    newer = older + [{"role": "assistant", "content": "answer"}, {"role": "user", "content": "second"}]
+    shared.put("c", "u", newer, 0)
+    # An older snapshot queued by another worker is written after the newer one was published
+    db._write("c", "u", older)
+    assert saved == [newer]
@@ -0,0 +1,44 @@
+import pytest
+from bench import fakes
+from utils import logic, metrics
+from utils.groqPool import GroqPool
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.setenv("GROQ_BASE_URL", fakes.start(fakes.FakeGroq))
+    monkeypatch.setattr(logic, "client", GroqPool(["keyA"]))
+    saved = []
+    events = []
+    # Record how many events had been sent when the conversation was persisted
+    monkeypatch.setattr(logic, "save_conversation_to_supabase", lambda cid, user_id: saved.append(len(events)))
+    def run(message, conversation_id):
+        for event in logic.stream_bot_response(message, conversation_id, "stream-user", use_cache=False):
+            events.append(event)
+        return events, saved
+    return run
+
+def _ttftCount():
+    h = metrics._histograms.get(("luna_ttft_seconds", (("source", "llm"),)))
+    return h[-1] if h else 0
+
+def test_answer_streams_as_tokens_then_persists(stream):
+    before = _ttftCount()
+    events, saved = stream("hello", "stream-plain")
+    kinds = [e["event"] for e in events]
+    assert set(kinds[:-1]) == {"token"} and kinds[-1] == "done"
+    assert "".join(e["text"] for e in events[:-1]).strip() == fakes.ANSWER
+    # Persisted once, after the last token and before done
+    assert saved == [len(events) - 1]
+    assert logic.conversations["stream-plain"][-1] == {"role": "assistant", "content": "".join(e["text"] for e in events[:-1])}
+    assert _ttftCount() == before + 1
+    assert "luna_ttft_seconds_bucket" in metrics.render()
+
+def test_tool_events_come_before_the_answer(stream, monkeypatch):
+    monkeypatch.setattr(logic, "TOOLS", {"webSearch": lambda query: f"results for {query}"})
+    events, saved = stream("[tool:webSearch] volcanoes", "stream-tool")
+    kinds = [e["event"] for e in events]
+    assert kinds[:2] == ["tool_start", "tool_end"] and events[0]["name"] == "webSearch"
+    assert set(kinds[2:-1]) == {"token"} and kinds[-1] == "done"
+    tool = next(m for m in logic.conversations["stream-tool"] if m["role"] == "tool")
+    assert tool["content"] == "results for volcanoes"
+    assert saved == [len(events) - 1]
@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+from utils import logic
+
+def _call(i, name):
+    return SimpleNamespace(id=f"call_{i}", function=SimpleNamespace(name=name, arguments="{}"))
+
+def _run(names):
+    runner = logic._runTools([_call(i, n) for i, n in enumerate(names)], "tools-test")
+    try:
+        while True:
+            next(runner)
+    except StopIteration:
+        pass
+    return {m["name"]: m["content"] for m in logic.conversations["tools-test"] if m["role"] == "tool"}
+
+@pytest.fixture
+def tools(monkeypatch):
+    def slow():
+        time.sleep(0.4)
+        return "slow done"
+    def fail():
+        raise RuntimeError("boom")
+    monkeypatch.setattr(logic, "TOOLS", {"slow": slow, "fast": lambda: "fast done", "fail": fail})
+    monkeypatch.setattr(logic, "TOOL_TIMEOUT", 0.25)
+    monkeypatch.setattr(logic, "TOOL_STAGE_TIMEOUT", 5)
+    monkeypatch.setattr(logic, "_tool_executor", ThreadPoolExecutor(1))
+    logic.conversations["tools-test"] = [{"role": "user", "content": "q"}]
+
+def test_queue_time_does_not_count_against_tool_timeout(tools):
+    results = _run(["slow", "fast"])
+    assert results["slow"] == "Tool slow timed out"
+    # fast waited behind slow for longer than TOOL_TIMEOUT, but ran instantly once started
+    assert results["fast"] == "fast done"
+
+def test_failed_tool_keeps_other_results(tools):
+    results = _run(["fail", "fast"])
+    assert results["fail"] == "Tool fail execution failed: boom"
+    assert results["fast"] == "fast done"
@@ -0,0 +1,52 @@
+import threading
+import time
+from utils.writeBehind import WriteBehindQueue
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+def _blocking_queue(events):
+    release = threading.Event()
+    def write(conversation_id, user_id, messages, truncate_to):
+        events.append("write started")
+        release.wait(5)
+        events.append("write done")
+    queue = WriteBehindQueue(write, flush_interval=3600)
+    return queue, release
+
+def test_pending_visible_while_writing():
+    events = []
+    queue, release = _blocking_queue(events)
+    queue.enqueue("c1", "u", MESSAGES)
+    flusher = threading.Thread(target=queue.flush)
+    flusher.start()
+    while not events:
+        time.sleep(0.01)
+    assert queue.pending("c1") == MESSAGES
+    release.set()
+    flusher.join()
+    assert queue.pending("c1") is None
+
+def test_pending_visible_while_waiting_to_retry():
+    def fail(*args):
+        raise RuntimeError("backend down")
+    queue = WriteBehindQueue(fail, flush_interval=3600)
+    queue.enqueue("c1", "u", MESSAGES)
+    queue.flush()
+    assert queue.pending("c1") == MESSAGES
+
+def test_discard_waits_for_inflight_write():
+    events = []
+    queue, release = _blocking_queue(events)
+    queue.enqueue("c1", "u", MESSAGES)
+    flusher = threading.Thread(target=queue.flush)
+    flusher.start()
+    while not events:
+        time.sleep(0.01)
+    discarder = threading.Thread(target=lambda: (queue.discard(conversation_id="c1"), events.append("discarded")))
+    discarder.start()
+    time.sleep(0.1)
+    release.set()
+    flusher.join()
+    discarder.join()
+    # The delete that follows discard() can no longer be overtaken by the write
+    assert events == ["write started", "write done", "discarded"]
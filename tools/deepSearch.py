@@ -1,23 +1,20 @@
 import os
-import requests
-from bs4 import BeautifulSoup
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from tools import httpClient, pageCache, googleSearch
 from dotenv import load_dotenv
-from groq import Groq
-from collections import deque
+from utils.groqPool import pool
+from utils import metrics
 
 load_dotenv()
-llm = Groq(api_key=os.getenv('GROQ_API_KEY'))
+llm = pool
+
+DEEP_SEARCH_WORKERS = int(os.getenv("DEEP_SEARCH_WORKERS", "4"))
+DEEP_SEARCH_TIME_BUDGET = float(os.getenv("DEEP_SEARCH_TIME_BUDGET", "60"))
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
 
 def getLinks(query, num=3):
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": os.getenv("GOOGLE_SEARCH_API_KEY"),
-        "cx": os.getenv("GOOGLE_SEARCH_ENGINE_ID"),
-        "q": query,
-        "num": num
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
+    data = googleSearch.search(query, num=num)
     links = []
     if "items" in data:
         for item in data["items"]:
@@ -34,10 +31,7 @@ def readContent(url, limit=500):
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
     }
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
-        paragraphs = soup.find_all("p")
-        return "\n\n".join([p.get_text() for p in paragraphs])[:limit]
+        return pageCache.fetchText(url, headers=headers, limit=limit, timeout=10)[:limit]
     except Exception:
         return ""
 
@@ -56,34 +50,20 @@ def getResponse(context, question, model='llama-3.3-70b-versatile'):
 def wikipediaSearch(query):
     texts = ""
     try:
-        url = f"https://en.wikipedia.org/w/api.php?action=query&format=json&list=search&srsearch={query}"
-        response = requests.get(url)
+        url = f"{WIKIPEDIA_API_URL}?action=query&format=json&list=search&srsearch={query}"
+        response = httpClient.get(url)
         data = response.json()
         search_results = data.get("query", {}).get("search", [])
         if search_results:
             page_id = search_results[0].get("pageid")
-            page_url = f"https://en.wikipedia.org/w/api.php?action=parse&format=json&pageid={page_id}"
-            page_response = requests.get(page_url)
-            page_data = page_response.json()
-            page_text = page_data.get("parse", {}).get("text", {}).get("*", "")
-            soup = BeautifulSoup(page_text, "html.parser")
-            paragraphs = soup.find_all("p")
-            texts = "\n\n".join([p.get_text() for p in paragraphs])
+            page_url = f"{WIKIPEDIA_API_URL}?action=parse&format=json&pageid={page_id}"
+            texts = pageCache.fetchText(page_url, extract=pageCache.wikiParseText, limit=1800)
         return texts[:1800]
     except Exception as e:
         return f"Error: {str(e)}"
 
 def imageSearch(query):
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": os.getenv("GOOGLE_SEARCH_API_KEY"),
-        "cx": os.getenv("GOOGLE_SEARCH_ENGINE_ID"),
-        "q": query,
-        "searchType": "image",
-        "num": 2,
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
+    data = googleSearch.search(query, num=2, searchType="image")
     res = ""
     if "items" in data:
         for item in data["items"]:
@@ -123,27 +103,47 @@ def processTopic(topic):
     combined = "\n\n".join(content_parts.values())
     return combined, content_parts
 
+def researchTopic(topic):
+    """Process one topic and find its related topics."""
+    content, sections = processTopic(topic)
+    if not content:
+        return None, []
+    return sections, extractRelatedTopics(content)
+
 def ai_agent_generate_report(initial_query):
     processed_topics = set()
-    topics_queue = deque([initial_query])
     report_sections = {}
     max_topics = 7  # maximum number of topics to process
+    deadline = time.monotonic() + DEEP_SEARCH_TIME_BUDGET
 
-    while topics_queue and len(processed_topics) < max_topics:
-        current_topic = topics_queue.popleft()
-        topic_key = current_topic.lower()
-        if topic_key in processed_topics:
-            continue
-        processed_topics.add(topic_key)
-        content, sections = processTopic(current_topic)
-        if not content:
-            continue
-        report_sections[current_topic] = sections
-        new_topics = extractRelatedTopics(content)
-        for nt in new_topics:
-            nt_key = nt.lower()
-            if nt_key not in processed_topics and nt not in topics_queue:
-                topics_queue.append(nt)
+    # Expand the frontier one level at a time; topics within a level run concurrently
+    pool = ThreadPoolExecutor(max_workers=DEEP_SEARCH_WORKERS, thread_name_prefix="deepsearch")
+    level = [initial_query]
+    while level and len(processed_topics) < max_topics and time.monotonic() < deadline:
+        batch = []
+        for topic in level:
+            topic_key = topic.lower()
+            if topic_key in processed_topics or len(processed_topics) >= max_topics:
+                continue
+            processed_topics.add(topic_key)
+            batch.append(topic)
+
+        futures = [pool.submit(metrics.carry(researchTopic), topic) for topic in batch]
+        wait(futures, timeout=max(0, deadline - time.monotonic()))
+
+        next_level = []
+        for topic, future in zip(batch, futures):
+            if not future.done() or future.cancelled() or future.exception():
+                print(f"Skipped topic: {topic}")
+                continue
+            sections, new_topics = future.result()
+            if sections:
+                report_sections[topic] = sections
+            for nt in new_topics:
+                if nt.lower() not in processed_topics and nt not in next_level:
+                    next_level.append(nt)
+        level = next_level
+    pool.shutdown(wait=False, cancel_futures=True)
 
     report_lines = ["# Comprehensive Report"]
     for topic, sections in report_sections.items():
@@ -0,0 +1,88 @@
+import codecs
+from html.parser import HTMLParser
+
+# Incremental paragraph extraction for tool pages. Text is collected from <p>
+# elements while the document is still being fed in, skipping boilerplate
+# containers, and parsing stops as soon as `limit` characters are gathered,
+# so a multi-megabyte page costs about as much as its first few paragraphs.
+SKIP_TAGS = {"script", "style", "nav", "header", "footer", "aside", "noscript", "svg", "template", "iframe"}
+# Block elements that implicitly close an open <p>
+BLOCK_TAGS = {
+    "address", "article", "blockquote", "details", "div", "dl", "fieldset", "figure", "h1", "h2", "h3", "h4",
+    "h5", "h6", "hr", "li", "main", "ol", "pre", "section", "table", "ul",
+}
+SEPARATOR = "\n\n"
+FEED_SIZE = 8 * 1024
+
+class ParagraphExtractor(HTMLParser):
+    def __init__(self, limit: int = None):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.paragraphs = []
+        self.length = 0
+        self.done = False
+        self._skip = 0
+        self._current = None
+
+    def _close(self) -> None:
+        if self._current is None:
+            return
+        text = "".join(self._current)
+        self._current = None
+        self.length += len(text) + (len(SEPARATOR) if self.paragraphs else 0)
+        self.paragraphs.append(text)
+        if self.limit is not None and self.length >= self.limit:
+            self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag == "p" or tag in BLOCK_TAGS:
+            self._close()
+            if tag == "p" and not self._skip:
+                self._current = []
+        elif tag == "br" and self._current is not None:
+            self._current.append("\n")
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "p" or tag in BLOCK_TAGS:
+            self._close()
+
+    def handle_data(self, data):
+        if self._current is not None and not self._skip and not self.done:
+            self._current.append(data)
+            if self.limit is not None and self.length + sum(map(len, self._current)) >= self.limit:
+                self._close()
+
+    def text(self) -> str:
+        self._close()
+        return SEPARATOR.join(self.paragraphs)
+
+def extractParagraphs(chunks, limit: int = None, encoding: str = "utf-8"):
+    """
+    Paragraph text from an iterable of HTML chunks (bytes or str).
+
+    Returns (text, complete); complete is False when reading stopped early
+    because limit was reached.
+    """
+    parser = ParagraphExtractor(limit)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        data = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        # Feed in small slices so a large chunk can still stop early
+        for start in range(0, len(data), FEED_SIZE):
+            parser.feed(data[start:start + FEED_SIZE])
+            if parser.done:
+                return parser.text(), False
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.text(), not parser.done
+
+def extractHtml(html: str, limit: int = None) -> str:
+    return extractParagraphs([html], limit)[0]
@@ -0,0 +1,80 @@
+import os
+import threading
+from concurrent.futures import Future
+from tools import httpClient
+from utils.cache import TTLCache
+
+# Shared front for every Google Custom Search call. Results are cached per
+# (query, searchType, gl); a cached response with more results also serves
+# smaller requests, and identical requests already in flight are joined
+# instead of being sent again.
+SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+
+_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_inflight = {}
+_lock = threading.Lock()
+_counters = {"coalesced": 0, "requests": 0}
+
+def normaliseQuery(query: str) -> str:
+    return " ".join(str(query).lower().split())
+
+def _slice(data: dict, num: int) -> dict:
+    if "items" not in data:
+        return data
+    return dict(data, items=data["items"][:num])
+
+def _fetch(query: str, num: int, searchType: str, gl: str) -> dict:
+    params = {
+        "key": os.getenv("GOOGLE_SEARCH_API_KEY"),
+        "cx": os.getenv("GOOGLE_SEARCH_ENGINE_ID"),
+        "q": query,
+        "num": num,
+    }
+    if searchType:
+        params["searchType"] = searchType
+    if gl:
+        params["gl"] = gl
+    _counters["requests"] += 1
+    response = httpClient.get(SEARCH_URL, params=params)
+    return response.json()
+
+def search(query: str, num: int = 10, searchType: str = None, gl: str = None) -> dict:
+    """Return the CSE JSON response for query, serving from cache when possible."""
+    key = (normaliseQuery(query), searchType, gl)
+
+    cached = _cache.get(key)
+    if cached and cached["num"] >= num:
+        return _slice(cached["data"], num)
+
+    with _lock:
+        pending = _inflight.get(key)
+        if pending and pending.num >= num:
+            _counters["coalesced"] += 1
+            leader = False
+        else:
+            pending = Future()
+            pending.num = num
+            _inflight[key] = pending
+            leader = True
+
+    if not leader:
+        return _slice(pending.result(), num)
+
+    try:
+        data = _fetch(query, num, searchType, gl)
+        if "error" not in data:
+            _cache.set(key, {"num": num, "data": data})
+        pending.set_result(data)
+        return data
+    except Exception as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            if _inflight.get(key) is pending:
+                del _inflight[key]
+
+def stats() -> dict:
+    return dict(_cache.stats(), **_counters)
@@ -0,0 +1,95 @@
+import os
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One pooled session shared by every tool, so repeated calls to the same host
+# (Google CSE, Wikipedia, ...) reuse keep-alive connections instead of paying
+# a TCP+TLS handshake each time.
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+MAX_RESPONSE_BYTES = int(os.getenv("HTTP_MAX_RESPONSE_BYTES", str(5 * 1024 * 1024)))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+# Longest Retry-After we will sleep for; the tool timeouts cannot interrupt the sleep
+MAX_RETRY_AFTER = float(os.getenv("HTTP_MAX_RETRY_AFTER", "3"))
+CHUNK_SIZE = 64 * 1024
+
+class CappedRetry(Retry):
+    """Retry that honours Retry-After only up to MAX_RETRY_AFTER seconds."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+def _build_session() -> requests.Session:
+    retry = CappedRetry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+session = _build_session()
+
+def request(method: str, url: str, timeout=None, max_bytes: int = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session.
+
+    The body is read incrementally and cut off at max_bytes (default
+    MAX_RESPONSE_BYTES); response.truncated tells whether that happened.
+    """
+    limit = max_bytes or MAX_RESPONSE_BYTES
+    response = session.request(
+        method,
+        url,
+        timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT),
+        stream=True,
+        **kwargs,
+    )
+    body = bytearray()
+    truncated = False
+    try:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            body += chunk
+            if len(body) > limit:
+                del body[limit:]
+                truncated = True
+                break
+    finally:
+        response.close()
+    response._content = bytes(body)
+    response.truncated = truncated
+    return response
+
+@contextmanager
+def stream(url: str, timeout=None, **kwargs):
+    """GET url without reading the body; iterate it with iterBody. The connection is released on exit."""
+    response = session.get(url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), stream=True, **kwargs)
+    try:
+        yield response
+    finally:
+        response.close()
+
+def iterBody(response: requests.Response, max_bytes: int = None):
+    """Yield the body of a streamed response in chunks, stopping after max_bytes."""
+    limit = max_bytes or MAX_RESPONSE_BYTES
+    read = 0
+    for chunk in response.iter_content(CHUNK_SIZE):
+        yield chunk[:limit - read]
+        read += len(chunk)
+        if read >= limit:
+            return
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
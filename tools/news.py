@@ -1,23 +1,18 @@
-from groq import Groq
 import os
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, wait
+from tools import pageCache, googleSearch
 from dotenv import load_dotenv
+from utils.groqPool import pool
+from utils import metrics
 
 load_dotenv()
-llm = Groq(api_key=os.getenv('GROQ_API_KEY'))
+llm = pool
+
+NEWS_WORKERS = int(os.getenv("NEWS_WORKERS", "6"))
+NEWS_STAGE_TIMEOUT = float(os.getenv("NEWS_STAGE_TIMEOUT", "25"))
 
 def getLinks(query):
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": os.getenv("GOOGLE_SEARCH_API_KEY"),
-        "cx": os.getenv("GOOGLE_SEARCH_ENGINE_ID"),
-        "q": query,
-        "num": 6
-        
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
+    data = googleSearch.search(query, num=6)
     links = []
     for item in data["items"]:
         links.append({
@@ -32,10 +27,7 @@ def readContent(url):
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
     }
     try:
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.text, "html.parser")
-        paragraphs = soup.find_all("p")
-        return "\n\n".join([p.get_text() for p in paragraphs])[:500]
+        return pageCache.fetchText(url, headers=headers, limit=500)[:500]
     except Exception as e:
         print(e)
         return ""
@@ -57,22 +49,34 @@ def getResponse(context, question):
     )
     return response.choices[0].message.content
 
+def summariseLink(link, question):
+    """Read one link and summarise it; returns None if the page is too short."""
+    context = readContent(link['link'])
+    if(len(context) < 150):
+        print(f"Context too short: {link['link']}")
+        return None
+    return getResponse(context, question)
+
 def main(question):
     links = getLinks(question)
+    
+    # Fetch + summarise every link concurrently; whatever misses the deadline is dropped
+    pool = ThreadPoolExecutor(max_workers=NEWS_WORKERS, thread_name_prefix="news")
+    futures = [pool.submit(metrics.carry(summariseLink), link, question) for link in links]
+    wait(futures, timeout=NEWS_STAGE_TIMEOUT)
+    pool.shutdown(wait=False, cancel_futures=True)
+    
     responses = ""
-    count = 1
-    for link in links:
-        print(f"{count}. Reading content from {link['link']}")
-        context = readContent(link['link'])
-        if(len(context) < 150):
-            print(f"{count}. Context too short.")
+    for link, future in zip(links, futures):
+        if not future.done() or future.cancelled():
+            print(f"Dropped slow link: {link['link']}")
+            continue
+        if future.exception():
+            print(f"Error summarising {link['link']}: {future.exception()}")
             continue
-        
-        print(f"{count}. Generating response")
-        response = getResponse(context, question)
-        
-        responses += f"Source: [{link['title']}]({link['link']})\nResponse: {response}\n\n"
-        count += 1
+        response = future.result()
+        if response:
+            responses += f"Source: [{link['title']}]({link['link']})\nResponse: {response}\n\n"
     
     answer = getResponse(responses, f"Answer my question in detail and also mention the sources at the end in the format[Title](URL). Question:  {question}")
     return answer
@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from tools import httpClient
+from tools.extract import extractParagraphs, extractHtml
+from utils.cache import TTLCache
+
+# Extracted page text, keyed by normalised URL. Entries past their TTL are
+# revalidated with ETag/Last-Modified rather than downloaded again. Pages read
+# with a character limit are extracted while streaming and may be stored
+# incomplete; such entries only serve requests they cover.
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "3600"))
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "2048"))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR")  # set to enable the on-disk tier
+
+_memory = TTLCache(
+    maxsize=PAGE_CACHE_SIZE,
+    ttl=PAGE_CACHE_TTL,
+    maxweight=PAGE_CACHE_MAX_BYTES,
+    weigh=lambda entry: len(entry["text"]),
+)
+_counters = {"revalidated": 0, "disk_hits": 0, "fetches": 0}
+
+def normaliseUrl(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (scheme, parts.port) in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+class _DiskTier:
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "pages.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, text TEXT, etag TEXT, last_modified TEXT, fetched_at REAL, complete INTEGER)"
+        )
+        try:
+            self._db.execute("ALTER TABLE pages ADD COLUMN complete INTEGER DEFAULT 1")
+        except sqlite3.OperationalError:
+            pass  # column already exists
+        self._db.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text, etag, last_modified, fetched_at, complete FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        if row:
+            return {"text": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3], "complete": bool(row[4])}
+
+    def set(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (key, text, etag, last_modified, fetched_at, complete) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry["text"], entry["etag"], entry["last_modified"], entry["fetched_at"], int(entry["complete"])),
+            )
+            self._db.commit()
+
+_disk = _DiskTier(PAGE_CACHE_DIR) if PAGE_CACHE_DIR else None
+
+def paragraphText(response, limit: int = None):
+    """Paragraph text of an HTML page, parsed from the byte stream; returns (text, complete)."""
+    return extractParagraphs(httpClient.iterBody(response), limit, response.encoding or "utf-8")
+
+def wikiParseText(response, limit: int = None):
+    """Paragraph text of a Wikipedia action=parse JSON response; returns (text, complete)."""
+    page_text = json.loads(b"".join(httpClient.iterBody(response))).get("parse", {}).get("text", {}).get("*", "")
+    text = extractHtml(page_text, limit)
+    return text, limit is None or len(text) < limit
+
+def _covers(entry: dict, limit: int) -> bool:
+    return entry["complete"] or (limit is not None and len(entry["text"]) >= limit)
+
+def _store(key: str, entry: dict) -> None:
+    remaining = entry["fetched_at"] + PAGE_CACHE_TTL - time.time()
+    _memory.set(key, entry, ttl=remaining)
+    if _disk:
+        _disk.set(key, entry)
+
+def fetchText(url: str, extract=paragraphText, headers: dict = None, limit: int = None, **kwargs) -> str:
+    """Return the extracted text of url (at least limit chars of it, if given), from cache when possible."""
+    key = normaliseUrl(url)
+    entry = _memory.get(key)
+    if entry and _covers(entry, limit):
+        return entry["text"]
+
+    entry = _memory.get_stale(key)
+    if entry is None and _disk:
+        entry = _disk.get(key)
+        if entry and entry["fetched_at"] + PAGE_CACHE_TTL > time.time() and _covers(entry, limit):
+            _counters["disk_hits"] += 1
+            _memory.set(key, entry, ttl=entry["fetched_at"] + PAGE_CACHE_TTL - time.time())
+            return entry["text"]
+    if entry and not _covers(entry, limit):
+        entry = None
+
+    headers = dict(headers or {})
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    _counters["fetches"] += 1
+    with httpClient.stream(url, headers=headers, **kwargs) as response:
+        if response.status_code == 304 and entry:
+            _counters["revalidated"] += 1
+            _store(key, dict(entry, fetched_at=time.time()))
+            return entry["text"]
+
+        text, complete = extract(response, limit)
+        if response.ok:
+            _store(key, {
+                "text": text,
+                "complete": complete,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            })
+    return text
+
+def stats() -> dict:
+    return dict(_memory.stats(), **_counters, disk=bool(_disk))
@@ -1,13 +1,15 @@
 from pydantic import BaseModel
-from groq import Groq
 import os
+import re
+import ast
 import json
 from typing import Dict
 from dotenv import load_dotenv
 from tools.tools import my_local_tools
+from utils.groqPool import pool
 
 load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+client = pool
 
 class Function(BaseModel):
     name: str
@@ -18,11 +20,118 @@ class ChatCompletionMessageToolCall(BaseModel):
     function: Function
     type: str
 
+# Short replies that may be a tool call the model failed to emit properly are
+# routed locally first: an explicit <function=name{...}> pseudo call, a URL to
+# read, or plain conversation. Only replies the rules can't settle go to the
+# LLM router below. _paths counts which route each reply took.
+_SCHEMAS = {}
+for _tool in my_local_tools:
+    _params = _tool["function"]["parameters"]
+    _props = {k: v for k, v in _params.get("properties", {}).items() if k != "required"}
+    # Some schemas carry "required" inside properties
+    _SCHEMAS[_tool["function"]["name"]] = {
+        "description": _tool["function"]["description"],
+        "parameters": list(_props),
+        "required": _params.get("required") or _params.get("properties", {}).get("required") or list(_props),
+    }
+
+_PSEUDO_CALL = re.compile(r"<function[=\s]*([\w-]+)\s*>?\s*[\(\[]?\s*(\{.*\})?", re.S)
+_URL = re.compile(r"https?://[^\s<>()\"']+")
+# Words that suggest the model meant to use a tool
+_TOOL_HINTS = re.compile(
+    r"\b(news|headlines?|search|look(ing)? up|find|images?|pictures?|photos?|wikipedia|qr|"
+    r"execute|run (the|this)? ?code|python|e-?mail|send|website|browse|function|tool)\b",
+    re.I,
+)
+_paths = {"pseudo_call": 0, "url": 0, "no_tool": 0, "llm": 0}
+
+def _parseArgs(text):
+    """Arguments from a JSON or Python-literal dict, or None if they can't be read."""
+    if not text:
+        return {}
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            args = parse(text)
+            return args if isinstance(args, dict) else None
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            # literal_eval raises TypeError on e.g. {["a"]: 1}, and the others on deep nesting
+            continue
+    # Trailing text after the object: keep the longest prefix that parses
+    end = text.rfind("}")
+    while end > 0:
+        try:
+            args = json.loads(text[:end + 1])
+            return args if isinstance(args, dict) else None
+        except (ValueError, RecursionError):
+            end = text.rfind("}", 0, end)
+    return None
+
+def _validArgs(schema, args):
+    """Schema arguments if every required one is a non-empty string and the rest are strings, else None."""
+    if not isinstance(args, dict):
+        return None
+    args = {k: v for k, v in args.items() if k in schema["parameters"]}
+    if not all(isinstance(v, str) for v in args.values()):
+        return None
+    if not all(args.get(p, "").strip() for p in schema["required"]):
+        return None
+    return args
+
+def _toolCall(name, args):
+    return [ChatCompletionMessageToolCall(
+        id="call_" + name,
+        function=Function(name=name, arguments=json.dumps(args)),
+        type="function",
+    )]
+
+def route(msg):
+    """
+    Decide locally whether msg is a tool call.
+
+    Returns (tool_calls, sure): tool_calls is a list or None, and sure is
+    False when the rules can't tell and the LLM router should decide.
+    """
+    match = _PSEUDO_CALL.search(msg)
+    if match:
+        name = match.group(1)
+        schema = _SCHEMAS.get(name)
+        args = _validArgs(schema, _parseArgs(match.group(2))) if schema else None
+        if args is not None:
+            _paths["pseudo_call"] += 1
+            return _toolCall(name, args), True
+        return None, False
+
+    urls = _URL.findall(msg)
+    if len(urls) == 1 and re.search(r"\b(read|open|visit|summari[sz]e|fetch|browse)", msg, re.I):
+        _paths["url"] += 1
+        return _toolCall("readWebsite", {"url": urls[0].rstrip(".,;:!?")}), True
+
+    if not _TOOL_HINTS.search(msg):
+        _paths["no_tool"] += 1
+        return None, True
+    return None, False
+
+def stats() -> dict:
+    total = sum(_paths.values())
+    return dict(_paths, local_rate=round(1 - _paths["llm"] / total, 4) if total else 0.0)
+
 def get_tool(msg):
+    tool_calls, sure = route(msg)
+    if sure:
+        return tool_calls
+    _paths["llm"] += 1
+    return _llmTool(msg)
+
+_TOOL_SUMMARY = json.dumps([
+    {"name": name, "description": schema["description"], "parameters": schema["parameters"]}
+    for name, schema in _SCHEMAS.items()
+])
+
+def _llmTool(msg):
     conversations = [
         {
             "role": "system",
-            "content": f"""Return all of your response in JSON format. with attribute toolNeeded, name and parameters only.\n\nTools are: {str(my_local_tools)}\n\n\nExample:
+            "content": f"""Return all of your response in JSON format. with attribute toolNeeded, name and parameters only.\n\nTools are: {_TOOL_SUMMARY}\n\n\nExample:
             {{
                 "toolNeeded": true,
                 "name": "newsFinder",
@@ -43,7 +152,10 @@ def get_tool(msg):
         )
         
         res = response.choices[0].message.content
-        res = json.loads(res)
+        res = _parseArgs(res[res.find("{"):].strip("` \n"))
+        if res is None:
+            print("Unreadable tool router reply:", response.choices[0].message.content)
+            return None
         
         needed = res.get("toolNeeded")
         if not needed:
@@ -51,11 +163,14 @@ def get_tool(msg):
         
         name = res.get("name")
         
-        if name not in ["newsFinder", "webSearch", "imageSearch", "readWebsite", "generate_qr_code", "WikipediaSearch", "code_executor", "sendEmail"]:
+        if name not in _SCHEMAS:
             print("Invalid tool name:", name)
             return None
         
-        params = res.get("parameters")
+        params = _validArgs(_SCHEMAS[name], res.get("parameters"))
+        if params is None:
+            print("Invalid tool parameters:", res.get("parameters"))
+            return None
         id = "call_" + name
         
         tool_call = ChatCompletionMessageToolCall(
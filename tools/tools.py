@@ -1,8 +1,7 @@
-import base64
 import io
 import qrcode
-import requests
-from bs4 import BeautifulSoup
+from tools import httpClient, pageCache, googleSearch
+from utils import blobStore
 import os
 from dotenv import load_dotenv
 from tools.news import main
@@ -10,6 +9,8 @@ from tools.deepSearch import ai_agent_generate_report
 
 load_dotenv()
 
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+
 my_local_tools = [
     {
         "type": "function",
@@ -181,41 +182,21 @@ def newsFinder(query: str) -> str:
 
 def webSearch(query: str) -> str:
     """Perform a web search and return top 3 links"""
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": os.getenv("GOOGLE_SEARCH_API_KEY"),
-        "cx": os.getenv("GOOGLE_SEARCH_ENGINE_ID"),
-        "q": query,
-        "num": 5,
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    output = ""
+    data = googleSearch.search(query, num=5)
+    output = "Return the results in proper markdown format, for example: 1. [\'title\'](\'url\')\n\'Description\'\n\n"
     count = 1
     for item in data["items"]:
         output += f"{count}. {item['title']}\n{item['link']}\n{item['snippet']}\n\n"
-        output += "\nRemember to return it in proper markdown format example: 1. [\'title\'](\'url\')\n\'Description\'\n"
         count += 1
     return output
 
 def imageSearch(query: str) ->str:
     """Search web for images using the given query and return urls"""
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": os.getenv("GOOGLE_SEARCH_API_KEY"),
-        "cx": os.getenv("GOOGLE_SEARCH_ENGINE_ID"),
-        "q": query,
-        "searchType": "image",
-        "gl": "in",
-        "num": 10,
-    }
-    response = requests.get(url, params=params)
-    data = response.json()["items"]
-    res = ""
+    data = googleSearch.search(query, num=10, searchType="image", gl="in")["items"]
+    res = "Return the images in proper markdown format, for example: ![\'ALT\'](\'URL\')\n\n"
     count = 1
     for item in data:
         res += f"{count}. URL: {item['link']}\nALT: {item['title']}\n\n"
-        res += "\nRemember to return it in proper markdown format example: ![\'ALT\'](\'URL\')\n"
         count += 1
     return res
 
@@ -233,36 +214,31 @@ def read_website(url: str) -> str:
         "Host": "www.google.com",
         "Referer": "https://www.google.com/",
     }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, "html.parser")
-    paragraphs = soup.find_all("p")
-    return "\n\n".join([p.get_text() for p in paragraphs])
+    return pageCache.fetchText(url, headers=headers)
 
 def wikipediaSearch(query: str) -> str:
     """"search wikipedia for the query and return the texts on the webpage"""
     texts = ""
     try:
-        url = f"https://en.wikipedia.org/w/api.php?action=query&format=json&list=search&srsearch={query}"
-        response = requests.get(url)
+        url = f"{WIKIPEDIA_API_URL}?action=query&format=json&list=search&srsearch={query}"
+        response = httpClient.get(url)
         data = response.json()
         search_results = data.get("query", {}).get("search", [])
         if search_results:
             page_id = search_results[0].get("pageid")
-            page_url = f"https://en.wikipedia.org/w/api.php?action=parse&format=json&pageid={page_id}"
+            page_url = f"{WIKIPEDIA_API_URL}?action=parse&format=json&pageid={page_id}"
             # print("\n\n", query, "\n\n", page_url, "\n\n")
-            page_response = requests.get(page_url)
-            page_data = page_response.json()
-            page_text = page_data.get("parse", {}).get("text", {}).get("*")
-            soup = BeautifulSoup(page_text, "html.parser")
-            paragraphs = soup.find_all("p")
-            texts = "\n\n".join([p.get_text() for p in paragraphs])
+            texts = pageCache.fetchText(page_url, extract=pageCache.wikiParseText, limit=1800)
         texts = texts[:1800]
         return texts
     except Exception as e:
         return f"Error searching Wikipedia: {str(e)}"
 
 def generate_qr_code(data: str) -> str:
-    """Generate QR code and return as base64 string"""
+    """Generate a QR code PNG (once per distinct data) and return its blob URL"""
+    return blobStore.url(blobStore.putDerived(f"qr:{data}", lambda: _qrPng(data), ".png"))
+
+def _qrPng(data: str) -> bytes:
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -273,10 +249,9 @@ def generate_qr_code(data: str) -> str:
     qr.make(fit=True)
     img = qr.make_image(fill_color="black", back_color="white")
     
-    # Convert to base64
     buffered = io.BytesIO()
     img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+    return buffered.getvalue()
 
 def code_executor(code: str) -> str:
     """Execute the python code and return the output"""
@@ -286,7 +261,7 @@ def code_executor(code: str) -> str:
         data = {
             "code": code
         }
-        response = requests.post(url, json=data)
+        response = httpClient.post(url, json=data, timeout=(httpClient.CONNECT_TIMEOUT, 60))
         data = response.json()
         if "error" in data or response.status_code != 200:
             # print("Error executing code:\n", data)
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+
+# Opt-in cache of final answers for standalone questions, keyed by the
+# normalised query and the system prompt it was answered under. Near-duplicate
+# queries are found with MinHash signatures over the query's content words and
+# word bigrams, bucketed with LSH so a lookup only compares against a few
+# candidates, and accepted when their shingle sets' Jaccard similarity reaches
+# the threshold. The bigrams keep word order, so "convert usd to inr" does not
+# match "convert inr to usd".
+# Entries expire according to the tools used to produce the answer.
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "0") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "4096"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.8"))
+
+# Freshness in seconds by tool; None means answers using that tool are never cached
+TOOL_TTL = {
+    None: 24 * 3600,  # answered without tools
+    "newsFinder": 15 * 60,
+    "webSearch": 3600,
+    "readWebsite": 3600,
+    "imageSearch": 24 * 3600,
+    "WikipediaSearch": 7 * 24 * 3600,
+    "generate_qr_code": None,
+    "code_executor": None,
+    "sendEmail": None,
+}
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = 4294967311  # smallest prime above 2**32
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 2 ** 31, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31, NUM_PERM).astype(np.uint64)
+
+_WORD = re.compile(r"\w+")
+_CONTRACTIONS = {"what's": "what is", "who's": "who is", "where's": "where is", "how's": "how is", "it's": "it is"}
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "on", "about", "for", "to", "in", "at", "me",
+    "please", "tell", "can", "could", "you", "i", "do", "does", "give", "show", "some", "any", "and",
+}
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (scope, normalised query) -> entry
+_buckets = {}  # (scope, band, band bytes) -> set of entry keys
+_counters = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+def normalise(query: str) -> str:
+    query = query.lower()
+    for short, full in _CONTRACTIONS.items():
+        query = query.replace(short, full)
+    return " ".join(_WORD.findall(query))
+
+def contentWords(normalised: str) -> list:
+    words = normalised.split()
+    return [w for w in words if w not in STOP_WORDS] or words or [""]
+
+def shingles(normalised: str) -> frozenset:
+    """Content words plus adjacent content-word pairs."""
+    words = contentWords(normalised)
+    return frozenset(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+def signature(shingles: frozenset) -> np.ndarray:
+    hashes = np.array([zlib.crc32(s.encode()) for s in shingles], dtype=np.uint64)
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+def _scope(system_prompt: str) -> str:
+    return hashlib.sha1((system_prompt or "").encode()).hexdigest()[:16]
+
+def _bands(scope: str, sig: np.ndarray):
+    return [(scope, b, sig[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)]
+
+def _drop(key) -> None:
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    for band in _bands(key[0], entry["signature"]):
+        keys = _buckets.get(band)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del _buckets[band]
+
+def _ttl(tools: list):
+    ttls = [TOOL_TTL.get(name) for name in (tools or [None])]
+    return None if None in ttls else min(ttls)
+
+def lookup(query: str, system_prompt: str):
+    """Cached answer for query (or a near-duplicate of it), or None."""
+    scope = _scope(system_prompt)
+    normalised = normalise(query)
+    now = time.time()
+    with _lock:
+        key = (scope, normalised)
+        entry = _entries.get(key)
+        near = False
+        if entry is None:
+            words = shingles(normalised)
+            candidates = set()
+            for band in _bands(scope, signature(words)):
+                candidates |= _buckets.get(band, set())
+            best = 0.0
+            for candidate in candidates:
+                other = _entries[candidate]["words"]
+                similarity = len(words & other) / len(words | other)
+                if similarity >= ANSWER_CACHE_THRESHOLD and similarity > best and _entries[candidate]["expires"] > now:
+                    key, entry, best, near = candidate, _entries[candidate], similarity, True
+        if entry is None or entry["expires"] <= now:
+            if entry is not None:
+                _drop(key)
+            _counters["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _counters["hits"] += 1
+        if near:
+            _counters["near_hits"] += 1
+        return entry["answer"]
+
+def store(query: str, system_prompt: str, answer: str, tools: list = None) -> None:
+    """Remember answer for query; tools are the names of the tools it was produced with."""
+    ttl = _ttl(tools)
+    if ttl is None or not answer:
+        return
+    scope = _scope(system_prompt)
+    normalised = normalise(query)
+    key = (scope, normalised)
+    words = shingles(normalised)
+    sig = signature(words)
+    with _lock:
+        _drop(key)
+        _entries[key] = {"answer": answer, "words": words, "signature": sig, "expires": time.time() + ttl}
+        for band in _bands(scope, sig):
+            _buckets.setdefault(band, set()).add(key)
+        _counters["stores"] += 1
+        while len(_entries) > ANSWER_CACHE_SIZE:
+            _drop(next(iter(_entries)))
+            _counters["evictions"] += 1
+
+def stats() -> dict:
+    lookups = _counters["hits"] + _counters["misses"]
+    return dict(
+        _counters,
+        enabled=ANSWER_CACHE,
+        size=len(_entries),
+        hit_rate=round(_counters["hits"] / lookups, 4) if lookups else 0.0,
+    )
@@ -0,0 +1,72 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+
+# Content-addressed store for generated binary artefacts (QR codes, images).
+# A blob is named by the sha256 of its bytes plus an extension, written once
+# under BLOB_DIR/<first two hex chars>/ and served from /blob/<name>, so
+# conversations only carry a short URL. BLOB_BASE_URL is prepended to that
+# URL when the frontend is served from another origin.
+BLOB_DIR = os.path.abspath(os.getenv("BLOB_DIR", "blobs"))
+BLOB_BASE_URL = os.getenv("BLOB_BASE_URL", "").rstrip("/")
+
+_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,8})?$")
+_counters = {"stores": 0, "dedups": 0, "derived_hits": 0}
+
+def _path(name: str) -> str:
+    return os.path.join(BLOB_DIR, name[:2], name)
+
+def _write(path: str, data: bytes) -> None:
+    # Write then rename, so a concurrent reader never sees a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def put(data: bytes, extension: str = "") -> str:
+    """Store data and return its blob name; storing the same bytes again is a no-op."""
+    name = hashlib.sha256(data).hexdigest() + extension
+    path = _path(name)
+    if os.path.exists(path):
+        _counters["dedups"] += 1
+        return name
+    _write(path, data)
+    _counters["stores"] += 1
+    return name
+
+def putDerived(key: str, make, extension: str = "") -> str:
+    """
+    Blob name for an artefact derived from key, calling make() -> bytes only
+    the first time. The key -> name mapping is kept on disk next to the blobs.
+    """
+    ref = os.path.join(BLOB_DIR, "refs", hashlib.sha256(key.encode()).hexdigest())
+    try:
+        with open(ref) as f:
+            name = f.read().strip()
+        if _NAME.match(name) and os.path.exists(_path(name)):
+            _counters["derived_hits"] += 1
+            return name
+    except OSError:
+        pass
+    name = put(make(), extension)
+    _write(ref, name.encode())
+    return name
+
+def path(name: str):
+    """Filesystem path of a stored blob, or None for unknown or malformed names."""
+    if not _NAME.match(name):
+        return None
+    path = _path(name)
+    return path if os.path.exists(path) else None
+
+def mimetype(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+def url(name: str) -> str:
+    return f"{BLOB_BASE_URL}/blob/{name}"
+
+def stats() -> dict:
+    return dict(_counters)
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL.
+
+    Bounded by entry count and, optionally, by total weight (e.g. bytes)
+    as measured by the weigh function. Expired entries are not removed on
+    read; they stay available through get_stale() until evicted, so callers
+    can revalidate them instead of refetching.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, maxweight: int = None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self.weigh = weigh or (lambda value: 1)
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, key, default=None):
+        """Return the entry even if it has expired, without touching the counters."""
+        with self._lock:
+            entry = self._data.get(key)
+            return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl: float = None) -> None:
+        weight = self.weigh(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.weight -= old[2]
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl), weight)
+            self.weight += weight
+            while self._data and (
+                len(self._data) > self.maxsize
+                or (self.maxweight is not None and self.weight > self.maxweight and len(self._data) > 1)
+            ):
+                _, evicted = self._data.popitem(last=False)
+                self.weight -= evicted[2]
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self.weight -= entry[2]
+            return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,136 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from utils.answerCache import STOP_WORDS
+from utils.context import countText
+from utils import metrics
+
+# Query-aware compaction of tool output before it enters the conversation.
+# Output over its tool's token budget is split into passages (paragraphs,
+# then lines, then sentences), ranked against the user's question with
+# BM25, and the best passages that fit are kept in their original order.
+# The first passage (lead paragraph, result header) is always kept, and URLs
+# from dropped passages are listed at the end, within a quarter of the
+# budget, so sources survive even when their text does not. Tools
+# missing from TOOL_BUDGETS are never compacted. Set TOOL_COMPACTION=0 to
+# pass output through unchanged.
+TOOL_COMPACTION = os.getenv("TOOL_COMPACTION", "1") == "1"
+PASSAGE_TOKENS = 120
+TOOL_BUDGETS = {
+    "readWebsite": 1000,
+    "newsFinder": 1200,
+    "WikipediaSearch": 600,
+    "webSearch": 500,
+    "imageSearch": 500,
+}
+K1, B = 1.5, 0.75
+
+_WORD = re.compile(r"\w+")
+_URL = re.compile(r"https?://[^\s)\]'\"<>]+")
+_SPLITS = (re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"(?<=[.!?])\s+"), re.compile(r"\s+"))
+_lock = threading.Lock()
+_stats = {}  # tool -> {"calls", "compacted", "tokens_in", "tokens_out"}
+
+def _terms(text: str) -> list:
+    return [w for w in _WORD.findall(text.lower()) if w not in STOP_WORDS]
+
+def passages(text: str, max_tokens: int = PASSAGE_TOKENS, level: int = 0) -> list:
+    """Split text into passages of roughly max_tokens, preferring the coarsest boundary that fits."""
+    if level == len(_SPLITS) or countText(text) <= max_tokens:
+        return [text.strip()] if text.strip() else []
+    out, current, used = [], "", 0
+    joiner = "\n\n" if level == 0 else "\n" if level == 1 else " "
+    for piece in _SPLITS[level].split(text):
+        tokens = countText(piece)
+        if tokens > max_tokens:
+            if current:
+                out.append(current)
+                current, used = "", 0
+            out += passages(piece, max_tokens, level + 1)
+        elif current and used + tokens > max_tokens:
+            out.append(current)
+            current, used = piece, tokens
+        else:
+            current = f"{current}{joiner}{piece}" if current else piece
+            used += tokens
+    if current.strip():
+        out.append(current.strip())
+    return out
+
+def bm25(query: str, docs: list) -> list:
+    """BM25 score of each passage against the query, with document statistics from the passages themselves."""
+    counts = [Counter(_terms(d)) for d in docs]
+    lengths = [sum(c.values()) for c in counts]
+    avg = sum(lengths) / len(docs) or 1
+    scores = [0.0] * len(docs)
+    for term in set(_terms(query)):
+        df = sum(1 for c in counts if term in c)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, c in enumerate(counts):
+            f = c.get(term, 0)
+            if f:
+                scores[i] += idf * f * (K1 + 1) / (f + K1 * (1 - B + B * lengths[i] / avg))
+    return scores
+
+def _record(name: str, tokens_in: int, tokens_out: int) -> None:
+    with _lock:
+        entry = _stats.setdefault(name, {"calls": 0, "compacted": 0, "tokens_in": 0, "tokens_out": 0})
+        entry["calls"] += 1
+        entry["compacted"] += tokens_out < tokens_in
+        entry["tokens_in"] += tokens_in
+        entry["tokens_out"] += tokens_out
+    if tokens_out < tokens_in:
+        metrics.inc("luna_tool_tokens_saved_total", tokens_in - tokens_out, tool=name)
+
+def compact(name: str, output, query: str, args: dict = None):
+    """Tool output cut down to the tool's budget, keeping what is most relevant to query."""
+    budget = TOOL_BUDGETS.get(name)
+    if not TOOL_COMPACTION or budget is None or not isinstance(output, str):
+        return output
+    tokens_in = countText(output)
+    if tokens_in <= budget:
+        _record(name, tokens_in, tokens_in)
+        return output
+
+    # The tool's own arguments (search terms, URL) count as part of the question
+    question = " ".join([query] + [str(v) for v in (args or {}).values()])
+    parts = passages(output)
+    sizes = [countText(p) for p in parts]
+    scores = bm25(question, parts)
+
+    # Room for the source line, the list of dropped URLs (at most a quarter) and the footer
+    header = [f"Source: {args['url']}"] if args and args.get("url") else []
+    urls = [u for u in dict.fromkeys(_URL.findall(output)) if u not in _URL.findall(parts[0])]
+    url_room = min(sum(countText(u) + 1 for u in urls), budget // 4)
+    room = budget - sum(countText(h) for h in header) - url_room - 20
+
+    keep, used = {0}, sizes[0]
+    for i in sorted(range(1, len(parts)), key=lambda i: (-scores[i], i)):
+        if used + sizes[i] <= room:
+            keep.add(i)
+            used += sizes[i]
+
+    kept = header + [parts[i] for i in sorted(keep)]
+    seen = set(_URL.findall("\n".join(kept)))
+    dropped, spent = [], 0
+    for u in urls:
+        if u not in seen and spent + countText(u) + 1 <= url_room:
+            dropped.append(u)
+            spent += countText(u) + 1
+    if dropped:
+        kept.append("Other sources: " + " ".join(dropped))
+    kept.append(f"(Showing the {len(keep)} most relevant of {len(parts)} passages.)")
+    result = "\n\n".join(kept)
+
+    tokens_out = countText(result)
+    _record(name, tokens_in, tokens_out)
+    print(f"Compacted {name}: {tokens_in} -> {tokens_out} tokens (saved {tokens_in - tokens_out})")
+    return result
+
+def stats() -> dict:
+    with _lock:
+        return {name: dict(entry, saved=entry["tokens_in"] - entry["tokens_out"]) for name, entry in _stats.items()}
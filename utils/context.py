@@ -0,0 +1,111 @@
+import hashlib
+import os
+from utils.cache import TTLCache
+
+# Prompt-side view of a conversation: the stored history is never modified,
+# but what is sent to the model is capped at CONTEXT_TOKEN_BUDGET by
+# collapsing old tool output and folding old turns into a rolling summary.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "llama-3.1-8b-instant")
+TOOL_SNIPPET_CHARS = 300
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Token counts keyed by (role, digest of content). Only the digest is kept, so
+# the cache never holds message bodies after their conversation is evicted.
+_token_counts = TTLCache(maxsize=50000, ttl=float("inf"))
+# conversation_id -> {"upto": index, "marker": digest of message upto-1, "text": summary}
+_summaries = TTLCache(maxsize=5000, ttl=float("inf"))
+
+def _digest(content: str) -> bytes:
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+def countText(text: str) -> int:
+    return len(_encoding.encode(text)) if _encoding else len(text) // 4
+
+def countTokens(message: dict) -> int:
+    content = str(message.get("content") or "")
+    key = (message.get("role"), _digest(content))
+    count = _token_counts.get(key)
+    if count is None:
+        count = countText(content) + 4
+        _token_counts.set(key, count)
+    return count
+
+def _collapse(message: dict) -> dict:
+    if message.get("role") != "tool" or len(str(message.get("content") or "")) <= TOOL_SNIPPET_CHARS:
+        return message
+    return dict(message, content=str(message["content"])[:TOOL_SNIPPET_CHARS] + " ...[earlier tool output truncated]")
+
+def _summarise(client, previous: str, messages: list) -> str:
+    transcript = "\n".join(
+        f"{m.get('role')}: {str(m.get('content') or '')[:1000]}" for m in messages if m.get("role") in ("user", "assistant")
+    )
+    prompt = (
+        "Update the running summary of a conversation with the new messages. "
+        "Keep facts, names, decisions and open questions; be brief.\n\n"
+        f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}\n\nUpdated summary:"
+    )
+    return client.chat.completions.create(
+        messages=[{"role": "user", "content": prompt}],
+        model=SUMMARY_MODEL,
+    ).choices[0].message.content.strip()
+
+def _marker(messages: list, upto: int):
+    return _digest(str(messages[upto - 1].get("content"))) if 0 < upto <= len(messages) else None
+
+def buildContext(conversation_id: str, messages: list, client, budget: int = None) -> list:
+    """Return the message list to send to the model for this conversation."""
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    if not messages:
+        return messages
+    head = 1 if messages[0].get("role") == "system" else 0
+    current = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=head)
+    history = [_collapse(m) for m in messages[head:current]]
+    full_tokens = sum(countTokens(m) for m in messages)
+
+    fixed = sum(countTokens(m) for m in messages[:head]) + sum(countTokens(m) for m in messages[current:])
+    if fixed + sum(countTokens(m) for m in history) <= budget:
+        context = messages[:head] + history + messages[current:]
+    else:
+        # Keep the most recent whole turns that fit in the remaining budget (a quarter is left for the summary)
+        remaining = budget * 3 // 4 - fixed
+        keep_from = current
+        used = 0
+        for i in range(current - 1, head - 1, -1):
+            used += countTokens(history[i - head])
+            if used > remaining:
+                break
+            if messages[i].get("role") == "user":
+                keep_from = i
+
+        summary = _summaries.get(conversation_id)
+        if summary and (summary["upto"] > current or summary["marker"] != _marker(messages, summary["upto"])):
+            summary = None  # history was truncated or rewritten
+        upto = summary["upto"] if summary else head
+        text = summary["text"] if summary else ""
+        if keep_from > upto:
+            try:
+                text = _summarise(client, text, messages[upto:keep_from])
+                upto = keep_from
+                _summaries.set(conversation_id, {"upto": upto, "marker": _marker(messages, upto), "text": text})
+            except Exception as e:
+                print(f"Error summarising conversation {conversation_id}: {str(e)}")
+        keep_from = max(keep_from, upto)
+
+        context = messages[:head]
+        if text:
+            context.append({"role": "system", "content": f"Summary of the earlier conversation:\n{text}"})
+        context += history[keep_from - head:] + messages[current:]
+
+    sent_tokens = sum(countTokens(m) for m in context)
+    if sent_tokens < full_tokens:
+        print(f"Context {conversation_id}: {full_tokens} -> {sent_tokens} tokens (saved {full_tokens - sent_tokens})")
+    return context
+
+def forget(conversation_id: str) -> None:
+    _summaries.pop(conversation_id)
@@ -0,0 +1,215 @@
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from utils.sharedState import KeyedLock, StateConflict
+
+def estimateSize(messages) -> int:
+    """Rough resident size of a message list in bytes."""
+    return sum(len(str(m.get("content") or "")) + 64 for m in messages)
+
+class ConversationStore:
+    """
+    Bounded, dict-like store for in-memory conversations.
+
+    Keeps at most max_entries conversations and roughly max_bytes of message
+    content, evicting the least recently used. The owner of each conversation
+    is remembered, so an evicted conversation is transparently reloaded
+    through loader(conversation_id, user_id) the next time it is read.
+
+    With a shared backend (utils/sharedState.py) the resident copy is only a
+    cache of the shared one: load() refreshes it when another worker has
+    published a newer version, and publish() writes it back with a version
+    check. lock() serialises turns on one conversation, across workers when
+    shared and across threads otherwise, and pins it in memory so a turn's
+    unsaved messages are never evicted mid-turn.
+    """
+
+    def __init__(self, max_entries: int = 500, max_bytes: int = 64 * 1024 * 1024, loader=None,
+                 shared=None, lock_timeout: float = 30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.shared = shared
+        self.lock_timeout = lock_timeout
+        self.bytes = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.refreshes = 0
+        self.conflicts = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._versions = {}  # conversation_id -> shared version of the resident copy
+        self._owners = OrderedDict()
+        self._pinned = Counter()  # conversation_id -> turns holding its lock
+        self._lock = threading.RLock()
+        self._turns = KeyedLock()
+
+    def _evict(self) -> None:
+        # The most recently used conversation and those mid-turn are never evicted,
+        # even if that leaves the store over its limits
+        while len(self._data) > 1 and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+            newest = next(reversed(self._data))
+            cid = next((c for c in self._data if c != newest and c not in self._pinned), None)
+            if cid is None:
+                return
+            del self._data[cid]
+            self.bytes -= self._sizes.pop(cid, 0)
+            self._versions.pop(cid, None)
+            self.evictions += 1
+
+    def _remember(self, conversation_id: str, user_id: str) -> None:
+        self._owners[conversation_id] = user_id
+        self._owners.move_to_end(conversation_id)
+        while len(self._owners) > self.max_entries * 10:
+            self._owners.popitem(last=False)
+
+    def _refresh(self, conversation_id: str):
+        """Bring the resident copy up to the shared version; returns the messages or None."""
+        version = self.shared.version(conversation_id)
+        with self._lock:
+            if conversation_id in self._data and self._versions.get(conversation_id, 0) == version:
+                # Unchanged, or created here and not yet published
+                self._data.move_to_end(conversation_id)
+                return self._data[conversation_id]
+        state = self.shared.get(conversation_id) if version else None
+        with self._lock:
+            if state is None:
+                # Deleted elsewhere, or expired: fall back to the loader
+                self.pop(conversation_id, forget=False)
+                return None
+            self.refreshes += 1
+            self[conversation_id] = state[2]
+            self._versions[conversation_id] = state[0]
+            return state[2]
+
+    def load(self, conversation_id: str, user_id: str):
+        """Return the conversation, loading it for user_id if it is not resident."""
+        with self._lock:
+            self._remember(conversation_id, user_id)
+            if conversation_id in self._data and self.shared is None:
+                self._data.move_to_end(conversation_id)
+                return self._data[conversation_id]
+        if self.shared is not None:
+            messages = self._refresh(conversation_id)
+            if messages is not None:
+                return messages
+        messages = self.loader(conversation_id, user_id) if self.loader else None
+        if messages is None:
+            return None
+        with self._lock:
+            if conversation_id in self._data:
+                return self._data[conversation_id]
+            self.reloads += 1
+            self[conversation_id] = messages
+            return messages
+
+    def owner(self, conversation_id: str):
+        return self._owners.get(conversation_id)
+
+    @contextmanager
+    def lock(self, conversation_id: str):
+        """Context manager held for a whole turn; raises LockTimeout after lock_timeout seconds."""
+        if self.shared is not None:
+            held = self.shared.lock(conversation_id, self.lock_timeout)
+        else:
+            held = self._turns(conversation_id, self.lock_timeout)
+        with held:
+            with self._lock:
+                self._pinned[conversation_id] += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._pinned[conversation_id] -= 1
+                    if not self._pinned[conversation_id]:
+                        del self._pinned[conversation_id]
+                    self._evict()
+
+    def publish(self, conversation_id: str, user_id: str) -> None:
+        """Write the resident copy to the shared backend; raises StateConflict if it was stale."""
+        if self.shared is None:
+            return
+        with self._lock:
+            messages = self._data.get(conversation_id)
+            expected = self._versions.get(conversation_id, 0)
+        if messages is None:
+            return
+        try:
+            version = self.shared.put(conversation_id, user_id, messages, expected)
+        except StateConflict:
+            self.conflicts += 1
+            self.pop(conversation_id, forget=False)
+            raise
+        with self._lock:
+            self._versions[conversation_id] = version
+
+    def touch(self, conversation_id: str) -> None:
+        """Re-measure a conversation after it was mutated in place."""
+        with self._lock:
+            messages = self._data.get(conversation_id)
+            if messages is None:
+                return
+            size = estimateSize(messages)
+            self.bytes += size - self._sizes.get(conversation_id, 0)
+            self._sizes[conversation_id] = size
+            self._data.move_to_end(conversation_id)
+            self._evict()
+
+    def __contains__(self, conversation_id) -> bool:
+        return conversation_id in self._data
+
+    def __getitem__(self, conversation_id):
+        with self._lock:
+            if conversation_id in self._data:
+                self._data.move_to_end(conversation_id)
+                return self._data[conversation_id]
+            user_id = self._owners.get(conversation_id)
+        if user_id is not None:
+            messages = self.load(conversation_id, user_id)
+            if messages is not None:
+                return messages
+        raise KeyError(conversation_id)
+
+    def __setitem__(self, conversation_id, messages) -> None:
+        with self._lock:
+            self.bytes -= self._sizes.get(conversation_id, 0)
+            self._data[conversation_id] = messages
+            self._data.move_to_end(conversation_id)
+            self._sizes[conversation_id] = estimateSize(messages)
+            self.bytes += self._sizes[conversation_id]
+            self._evict()
+
+    def get(self, conversation_id, default=None):
+        try:
+            return self[conversation_id]
+        except KeyError:
+            return default
+
+    def pop(self, conversation_id, default=None, forget: bool = True):
+        with self._lock:
+            if forget:
+                self._owners.pop(conversation_id, None)
+            self._versions.pop(conversation_id, None)
+            self.bytes -= self._sizes.pop(conversation_id, 0)
+            return self._data.pop(conversation_id, default)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+            "shared": self.shared.name if self.shared is not None else None,
+            "refreshes": self.refreshes,
+            "conflicts": self.conflicts,
+            "pinned": len(self._pinned),
+        }
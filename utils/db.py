@@ -1,31 +1,128 @@
 import os
+import atexit
 from supabase import create_client, Client
+from utils.conversationStore import ConversationStore
+from utils.sharedState import createState
+from utils.persistence import createBackend
+from utils.writeBehind import WriteBehindQueue
+from utils.searchIndex import search_index
+from utils import metrics
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-conversations = {}
+# array (default), delta or sqlite; see utils/persistence.py
+PERSISTENCE_MODE = os.getenv("PERSISTENCE_MODE", "array")
+backend = createBackend(PERSISTENCE_MODE, supabase, os.getenv("SQLITE_DB_PATH", "conversations.sqlite"))
 
+# Live conversation state shared by all workers: unset (this process only), redis or local;
+# see utils/sharedState.py. Needed before running gunicorn with more than one worker.
+shared = createState(
+    os.getenv("STATE_BACKEND"),
+    os.getenv("REDIS_URL"),
+    ttl=int(os.getenv("STATE_TTL", "86400")),
+    lock_ttl=int(os.getenv("STATE_LOCK_TTL", "180")),
+)
+
+# Resident conversations, bounded and LRU-evicted; misses reload from shared state, then supabase
+conversations = ConversationStore(
+    max_entries=int(os.getenv("CONVERSATION_CACHE_ENTRIES", "500")),
+    max_bytes=int(os.getenv("CONVERSATION_CACHE_BYTES", str(64 * 1024 * 1024))),
+    loader=lambda conversation_id, user_id: get_conversation_from_supabase(conversation_id, user_id),
+    shared=shared,
+    lock_timeout=float(os.getenv("STATE_LOCK_WAIT", "30")),
+)
+
+@metrics.span("db.write")
+def _write(conversation_id: str, user_id: str, messages: list, truncate_to: int = None) -> None:
+    if shared is not None:
+        # Another worker may have queued an older snapshot behind ours; always write the newest
+        state = shared.get(conversation_id)
+        if state is not None:
+            messages = state[2]
+    if truncate_to is not None:
+        backend.truncate(conversation_id, user_id, truncate_to, messages)
+    backend.save(conversation_id, user_id, messages)
+
+# Saves leave the request path and are written by a background thread; set WRITE_BEHIND=0 to write inline
+writer = None
+if os.getenv("WRITE_BEHIND", "1") == "1":
+    writer = WriteBehindQueue(
+        _write,
+        max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "50")),
+        flush_interval=float(os.getenv("WRITE_BEHIND_INTERVAL", "1.0")),
+    )
+    atexit.register(writer.flush)
+
+@metrics.span("db.flush")
+def flush_pending_writes() -> None:
+    if writer:
+        writer.flush()
+
+@metrics.span("db.save")
 def save_conversation_to_supabase(conversation_id: str, user_id: str) -> None:
     try:
         data = conversations.get(conversation_id, [])
-        supabase.table("conversations").upsert({
-            "conversation_id": conversation_id,
-            "user_id": user_id,
-            "messages": data
-        }).execute()
+        conversations.touch(conversation_id)
+        conversations.publish(conversation_id, user_id)
+        if writer:
+            writer.enqueue(conversation_id, user_id, data)
+        else:
+            backend.save(conversation_id, user_id, data)
     except Exception as e:
         print(f"Error saving conversation to supabase: {str(e)}")
+    _index(conversation_id, user_id)
+
+@metrics.span("db.index")
+def _index(conversation_id: str, user_id: str) -> None:
+    try:
+        search_index.update(conversation_id, user_id, conversations.get(conversation_id, []))
+    except Exception as e:
+        print(f"Error updating search index: {str(e)}")
 
+@metrics.span("db.load")
 def get_conversation_from_supabase(conversation_id: str, user_id: str):
     try:
-        res = supabase.table("conversations")\
-            .select("*")\
-            .eq("conversation_id", conversation_id)\
-            .eq("user_id", user_id)\
-            .execute()
-        if res.data:
-            return res.data[0]["messages"]
+        pending = writer.pending(conversation_id) if writer else None
+        if pending is not None:
+            return pending
+        return backend.load(conversation_id, user_id)
     except Exception as e:
         print(f"Error getting conversation from supabase: {str(e)}")
+
+@metrics.span("db.truncate")
+def truncate_conversation_in_supabase(conversation_id: str, user_id: str, length: int) -> None:
+    try:
+        data = conversations.get(conversation_id, [])
+        conversations.publish(conversation_id, user_id)
+        if writer:
+            writer.enqueue(conversation_id, user_id, data, truncate_to=length)
+        else:
+            _write(conversation_id, user_id, data, truncate_to=length)
+    except Exception as e:
+        print(f"Error truncating conversation in supabase: {str(e)}")
+    _index(conversation_id, user_id)
+
+@metrics.span("db.delete")
+def delete_conversation_from_supabase(conversation_id: str, user_id: str) -> None:
+    if writer:
+        writer.discard(conversation_id=conversation_id)
+    if shared is not None:
+        shared.delete(conversation_id)
+    search_index.delete(conversation_id)
+    backend.delete(conversation_id, user_id)
+
+@metrics.span("db.delete_user")
+def delete_user_conversations_from_supabase(user_id: str) -> None:
+    if writer:
+        writer.discard(user_id=user_id)
+    if shared is not None:
+        shared.delete_user(user_id)
+    search_index.delete_user(user_id)
+    backend.delete_user(user_id)
+
+@metrics.span("db.list")
+def list_conversations_from_supabase(user_id: str, cursor: str = None, limit: int = 50) -> dict:
+    """One page of conversation summaries, newest first; pass next_cursor back for the following page."""
+    return backend.list(user_id, limit=limit, cursor=cursor)
@@ -0,0 +1,261 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from groq import Groq, RateLimitError, APIConnectionError, APIStatusError
+from dotenv import load_dotenv
+from utils import metrics
+
+load_dotenv()
+
+# One pool of Groq clients shared by the chat pipeline and the tools, spread
+# over every GROQ_API_KEY* in the environment. Each key keeps a bucket per
+# model, refreshed from the x-ratelimit-* headers of its responses and
+# debited by an estimate before each request, so calls go to the key with the
+# most headroom. A 429 puts that key/model on a jittered cooldown and the
+# request is retried on another key. Connection errors, timeouts, 408/409 and
+# 5xx responses are retried after a short backoff, as the SDK's own retries
+# (disabled on the clients) would have done. Callers for the same model wait
+# in FIFO order when no key has room.
+GROQ_MAX_ATTEMPTS = int(os.getenv("GROQ_MAX_ATTEMPTS", "4"))
+GROQ_QUEUE_TIMEOUT = float(os.getenv("GROQ_QUEUE_TIMEOUT", "30"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+TRANSIENT_BACKOFF = 0.5
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def apiKeys() -> list:
+    """GROQ_API_KEY first, then GROQ_API_KEY_* in name order, without duplicates."""
+    names = ["GROQ_API_KEY"] + sorted(k for k in os.environ if k.startswith("GROQ_API_KEY_"))
+    keys = []
+    for name in names:
+        key = os.getenv(name)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+def _seconds(value):
+    """Parse a reset header such as "7.66s", "2m59.56s" or "120ms"."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parts = _DURATION.findall(value)
+        return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _transient(error: Exception) -> bool:
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in (408, 409) or error.status_code >= 500)
+
+def estimateTokens(kwargs: dict) -> int:
+    chars = sum(len(str(m.get("content") or "")) for m in kwargs.get("messages", []))
+    return chars // 4 + (kwargs.get("max_tokens") or 512)
+
+class _Bucket:
+    """What one key may still send to one model; None means unknown (no limit seen yet)."""
+
+    def __init__(self):
+        self.requests = None
+        self.tokens = None
+        self.requests_reset = 0.0
+        self.tokens_reset = 0.0
+        self.cooldown_until = 0.0
+        self.failures = 0
+
+    def refill(self, now: float) -> None:
+        if self.requests is not None and now >= self.requests_reset:
+            self.requests = None
+        if self.tokens is not None and now >= self.tokens_reset:
+            self.tokens = None
+
+    def ready_at(self, now: float, cost: int) -> float:
+        """Earliest time this bucket can take a request of cost tokens."""
+        self.refill(now)
+        at = self.cooldown_until
+        if self.requests is not None and self.requests < 1:
+            at = max(at, self.requests_reset)
+        if self.tokens is not None and self.tokens < cost:
+            at = max(at, self.tokens_reset)
+        return at
+
+    def update(self, headers, now: float) -> None:
+        requests, tokens = _int(headers.get("x-ratelimit-remaining-requests")), _int(headers.get("x-ratelimit-remaining-tokens"))
+        if requests is not None:
+            self.requests = requests
+            self.requests_reset = now + (_seconds(headers.get("x-ratelimit-reset-requests")) or 60)
+        if tokens is not None:
+            self.tokens = tokens
+            self.tokens_reset = now + (_seconds(headers.get("x-ratelimit-reset-tokens")) or 60)
+
+class _Key:
+    def __init__(self, api_key: str):
+        self.name = "..." + api_key[-4:]
+        self.client = Groq(api_key=api_key, max_retries=0)
+        self.buckets = {}
+        self.requests = 0
+        self.rate_limited = 0
+        self.inflight = 0
+
+    def bucket(self, model: str) -> _Bucket:
+        return self.buckets.setdefault(model, _Bucket())
+
+class GroqPool:
+    def __init__(self, keys: list):
+        if not keys:
+            raise ValueError("No Groq API keys configured (GROQ_API_KEY, GROQ_API_KEY_2, ...)")
+        self._keys = [_Key(k) for k in keys]
+        self._cond = threading.Condition()
+        self._queues = {}  # model -> deque of waiting tickets
+        self._counters = {"requests": 0, "retries": 0, "transient_retries": 0, "queued": 0, "queue_timeouts": 0, "wait_seconds": 0.0}
+        # Drop-in for Groq(): pool.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def rotate(self) -> None:
+        """Prefer the next key when several have the same headroom."""
+        with self._cond:
+            self._keys.append(self._keys.pop(0))
+
+    def _pick(self, model: str, cost: int, now: float):
+        """(key, 0) for the key with the most headroom, or (None, seconds until one frees up)."""
+        best, best_room, soonest = None, None, None
+        for key in self._keys:
+            bucket = key.bucket(model)
+            at = bucket.ready_at(now, cost)
+            if at > now:
+                soonest = at if soonest is None else min(soonest, at)
+                continue
+            # Most tokens left, then fewest requests in flight
+            room = (float("inf") if bucket.tokens is None else bucket.tokens, -key.inflight)
+            if best is None or room > best_room:
+                best, best_room = key, room
+        return (best, 0) if best else (None, soonest - now)
+
+    def _acquire(self, model: str, cost: int) -> _Key:
+        deadline = time.monotonic() + GROQ_QUEUE_TIMEOUT
+        ticket = object()
+        with self._cond:
+            queue = self._queues.setdefault(model, deque())
+            queue.append(ticket)
+            started = None
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = 1.0
+                    if queue[0] is ticket:
+                        key, wait = self._pick(model, cost, now)
+                        if key:
+                            bucket = key.bucket(model)
+                            if bucket.requests is not None:
+                                bucket.requests -= 1
+                            if bucket.tokens is not None:
+                                bucket.tokens -= cost
+                            key.inflight += 1
+                            if started is not None:
+                                self._counters["queued"] += 1
+                                self._counters["wait_seconds"] += now - started
+                            return key
+                    # Give up early when the next free slot is already past the deadline
+                    remaining = deadline - now
+                    if remaining <= 0 or (queue[0] is ticket and wait > remaining):
+                        self._counters["queue_timeouts"] += 1
+                        raise TimeoutError(f"No Groq key available for {model} within {GROQ_QUEUE_TIMEOUT}s")
+                    started = started or now
+                    self._cond.wait(timeout=min(wait, remaining, 1.0))
+            finally:
+                queue.remove(ticket)
+                self._cond.notify_all()
+
+    def _rateLimited(self, key: _Key, model: str, error: RateLimitError) -> None:
+        with self._cond:
+            bucket = key.bucket(model)
+            bucket.failures += 1
+            key.rate_limited += 1
+            retry_after = _seconds(error.response.headers.get("retry-after")) if error.response is not None else None
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (bucket.failures - 1))
+            bucket.cooldown_until = time.monotonic() + (retry_after or backoff) * random.uniform(1.0, 1.5)
+            self._cond.notify_all()
+
+    def create(self, **kwargs):
+        """chat.completions.create on the least loaded key, moving to another key on 429 and retrying transient errors."""
+        model = kwargs.get("model")
+        cost = estimateTokens(kwargs)
+        self._counters["requests"] += 1
+        for attempt in range(GROQ_MAX_ATTEMPTS):
+            key = self._acquire(model, cost)
+            key.requests += 1
+            try:
+                with metrics.span("groq", model=model, key=key.name):
+                    raw = key.client.chat.completions.with_raw_response.create(**kwargs)
+            except RateLimitError as e:
+                self._rateLimited(key, model, e)
+                if attempt == GROQ_MAX_ATTEMPTS - 1:
+                    raise
+                self._counters["retries"] += 1
+                continue
+            except Exception as e:
+                if not _transient(e) or attempt == GROQ_MAX_ATTEMPTS - 1:
+                    raise
+                self._counters["transient_retries"] += 1
+                raw = None
+            finally:
+                with self._cond:
+                    key.inflight -= 1
+            if raw is None:
+                time.sleep(TRANSIENT_BACKOFF * 2 ** attempt * random.uniform(1.0, 1.5))
+                continue
+            with self._cond:
+                bucket = key.bucket(model)
+                bucket.update(raw.headers, time.monotonic())
+                bucket.failures = 0
+                self._cond.notify_all()
+            if kwargs.get("stream"):
+                return _countStream(raw.parse(), model)
+            result = raw.parse()
+            metrics.countTokens(model, result.usage)
+            return result
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            return dict(
+                self._counters,
+                wait_seconds=round(self._counters["wait_seconds"], 3),
+                waiting={model: len(q) for model, q in self._queues.items() if q},
+                keys=[{
+                    "key": key.name,
+                    "requests": key.requests,
+                    "inflight": key.inflight,
+                    "rate_limited": key.rate_limited,
+                    "models": {
+                        model: {
+                            "remaining_requests": b.requests,
+                            "remaining_tokens": b.tokens,
+                            "cooldown": round(max(0.0, b.cooldown_until - now), 2),
+                        }
+                        for model, b in key.buckets.items()
+                    },
+                } for key in self._keys],
+            )
+
+def _countStream(stream, model):
+    # Groq reports a streamed completion's usage on its last chunk
+    for chunk in stream:
+        x_groq = getattr(chunk, "x_groq", None)
+        if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+            metrics.countTokens(model, x_groq.usage)
+        yield chunk
+
+pool = GroqPool(apiKeys())
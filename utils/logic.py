@@ -1,29 +1,77 @@
-from groq import Groq
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from tools.tools import ( my_local_tools, newsFinder, webSearch, imageSearch, read_website, generate_qr_code, wikipediaSearch, code_executor, sendEmail )
-from tools.parseTool import get_tool
-from utils.db import conversations, save_conversation_to_supabase, get_conversation_from_supabase
+from tools.parseTool import get_tool, ChatCompletionMessageToolCall, Function
+from utils.db import conversations, save_conversation_to_supabase
+from utils.sharedState import LockTimeout
 from utils.systemPrompt import get_sys_prompt
+from utils.context import buildContext
+from utils import rag
+from utils import answerCache
+from utils import compaction
+from utils.groqPool import pool
+from utils import metrics
 
-_switchKey = False
 def switchKey():
-    global _switchKey
-    _switchKey = not _switchKey
-    return _switchKey
+    # Keys are chosen by rate-limit headroom; this only changes which one wins a tie
+    pool.rotate()
 
-client = Groq(api_key= _switchKey and os.getenv("GROQ_API_KEY") or os.getenv("GROQ_API_KEY_2"))
+client = pool
 
 def _initialize_conversation(user_id: str, conversation_id: str) -> None:
-    if conversation_id not in conversations:
-        data = get_conversation_from_supabase(conversation_id, user_id)
-        if data:
-            conversations[conversation_id] = data
-        else:
-            conversations[conversation_id] = [{
-                "role": "system",
-                "content": get_sys_prompt(user_id)
-            }]
+    if not conversations.load(conversation_id, user_id):
+        conversations[conversation_id] = [{
+            "role": "system",
+            "content": get_sys_prompt(user_id)
+        }]
+
+@metrics.span("prompt")
+def _prompt(conversation_id: str, user_id: str) -> list:
+    """Messages to send for this turn: the context window plus passages from the user's documents."""
+    messages = buildContext(conversation_id, conversations[conversation_id], client)
+    query = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    try:
+        passages = rag.retrieve(user_id, query)
+    except Exception as e:
+        print(f"Error retrieving document context: {str(e)}")
+        passages = []
+    if not passages:
+        return messages
+    docs = "\n\n".join(f"[{p['source']}]\n{p['text']}" for p in passages)
+    last_user = max(i for i, m in enumerate(messages) if m.get("role") == "user")
+    return messages[:last_user] + [{
+        "role": "system",
+        "content": f"Relevant excerpts from the user's uploaded documents:\n\n{docs}",
+    }] + messages[last_user:]
+
+def _cacheScope(conversation_id: str, user_id: str):
+    """
+    System prompt to key the answer cache with, or None when this turn can't
+    use it: the cache is off, the question is a follow-up that depends on
+    earlier turns, or the user has uploaded documents.
+    """
+    messages = conversations[conversation_id]
+    if not answerCache.ANSWER_CACHE or any(m.get("role") != "system" for m in messages):
+        return None
+    if rag.hasContext(user_id):
+        return None
+    return messages[0].get("content", "")
+
+def _cachedAnswer(scope, user_query, conversation_id, user_id):
+    answer = answerCache.lookup(user_query, scope) if scope is not None else None
+    if answer is not None:
+        conversations[conversation_id].append({"role": "user", "content": user_query})
+        conversations[conversation_id].append({"role": "assistant", "content": answer})
+        save_conversation_to_supabase(conversation_id, user_id)
+    return answer
+
+def _remember(scope, user_query, conversation_id, tool_calls) -> None:
+    last = conversations[conversation_id][-1]
+    # Only completed turns end with an assistant message; errors are not cached
+    if scope is not None and last.get("role") == "assistant":
+        answerCache.store(user_query, scope, last["content"], [t.function.name for t in tool_calls or []])
 
 TOOLS = {
     "newsFinder": newsFinder,
@@ -36,37 +84,108 @@ TOOLS = {
     "sendEmail": sendEmail,
 }
 
-def _handleTools(tool_calls, conversation_id, user_id):
-    qr_tool = None
+# Tool calls from every request share this pool. It is sized for every gunicorn
+# thread running a few tools at once, since a timed-out tool keeps its worker
+# until it returns. TOOL_TIMEOUT counts from when a tool starts running, so
+# time spent queued behind other requests' tools only counts against the stage.
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", str(int(os.getenv("GUNICORN_THREADS", "32")) * 2)))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+TOOL_STAGE_TIMEOUT = float(os.getenv("TOOL_STAGE_TIMEOUT", "45"))
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+class ToolError(Exception):
+    pass
+
+def _qrImage(qr_url):
+    return f"\n\n<img src='{qr_url}' alt='QR Code' class='rounded h-[300px] w-[300px] rouned-2xl mt-3 '/>"
+
+def _callTool(name, func, args, query, started):
+    started["at"] = time.monotonic()
+    with metrics.span(f"tool.{name}"):
+        res = func(**args)
+    with metrics.span("compact", tool=name):
+        return compaction.compact(name, res, query, args)
+
+def _toolResult(future, started: dict, stage_deadline: float):
+    """Wait for a tool, raising FutureTimeout once TOOL_TIMEOUT has passed since it started, or the stage deadline."""
+    while True:
+        begun = started.get("at")
+        deadline = stage_deadline if begun is None else min(begun + TOOL_TIMEOUT, stage_deadline)
+        wait = deadline - time.monotonic()
+        try:
+            # Still queued: check back shortly to start its own clock
+            return future.result(timeout=max(0, min(wait, 0.05) if begun is None else wait))
+        except FutureTimeout:
+            if time.monotonic() >= deadline:
+                raise
+
+def _runTools(tool_calls, conversation_id):
+    """
+    Run the tool calls concurrently, yielding tool_start/tool_end events.
+
+    Results are appended in the original tool_call order so the follow-up
+    completion sees the same history regardless of which tool finished
+    first. Returns the QR code's blob URL, if any.
+    """
+    calls = []
     for t in tool_calls:
         name = t.function.name
-        func = TOOLS[name]
+        func = TOOLS.get(name)
         if not func:
             continue
-        
         try:
-            args = json.loads(t.function.arguments)
-            res = func(**args)
-            
+            calls.append((t, name, func, json.loads(t.function.arguments)))
+        except json.JSONDecodeError as e:
+            raise ToolError(f"JSON Decode Error: {str(e)}")
+    
+    stage_deadline = time.monotonic() + TOOL_STAGE_TIMEOUT
+    query = next((m["content"] for m in reversed(conversations[conversation_id]) if m.get("role") == "user"), "")
+    pending = []
+    for t, name, func, args in calls:
+        yield {"event": "tool_start", "name": name}
+        started = {}
+        future = _tool_executor.submit(metrics.carry(_callTool), name, func, args, query, started)
+        pending.append((t, name, future, started))
+    
+    qr_tool = None
+    for t, name, future, started in pending:
+        try:
+            res = _toolResult(future, started, stage_deadline)
             if name == "generate_qr_code":
+                # The image is attached to the reply; the model only sees its URL
                 qr_tool = res
-                res = f"data:image/png;base64,{res}"
-            
-            conversations[conversation_id].append({"role": "tool", "content": res, "tool_call_id" : t.id, "name" : name})
-        
-        except json.JSONDecodeError as e:
-            return f"JSON Decode Error: {str(e)}"
+                res = f"QR code generated and shown to the user: {res}"
+        except FutureTimeout:
+            future.cancel()
+            res = f"Tool {name} timed out"
         except Exception as e:
-            return f"Tool {name} execution failed: {str(e)}"
+            # Like a timeout, a failed tool only loses its own result
+            print(f"Tool {name} error: {str(e)}")
+            res = f"Tool {name} execution failed: {str(e)}"
+        
+        conversations[conversation_id].append({"role": "tool", "content": res, "tool_call_id" : t.id, "name" : name})
+        yield {"event": "tool_end", "name": name}
+    return qr_tool
+
+def _handleTools(tool_calls, conversation_id, user_id):
+    try:
+        runner = _runTools(tool_calls, conversation_id)
+        while True:
+            next(runner)
+    except StopIteration as done:
+        qr_tool = done.value
+    except ToolError as e:
+        return str(e)
     
     try:
-        finalRes = client.chat.completions.create(
-            messages=conversations[conversation_id],
-            model = "llama-3.3-70b-versatile",
-            ).choices[0].message.content
+        with metrics.span("llm.final"):
+            finalRes = client.chat.completions.create(
+                messages=_prompt(conversation_id, user_id),
+                model = "llama-3.3-70b-versatile",
+                ).choices[0].message.content
         
         if qr_tool:
-            finalRes += f"\n\n<img src='data:image/png;base64,{qr_tool}' alt='QR Code' class='rounded h-[300px] w-[300px] rouned-2xl mt-3 '/>"
+            finalRes += _qrImage(qr_tool)
         
         conversations[conversation_id].append({"role": "assistant", "content": finalRes})
         save_conversation_to_supabase(conversation_id, user_id)
@@ -74,38 +193,170 @@ def _handleTools(tool_calls, conversation_id, user_id):
     except Exception as e:
         return f"Error: {str(e)}"
     
-def get_bot_response(user_query, conversation_id, user_id):
+def get_bot_response(user_query, conversation_id, user_id, use_cache=True):
+    # One turn at a time per conversation, so concurrent requests don't interleave their messages
+    with conversations.lock(conversation_id):
+        return _botResponse(user_query, conversation_id, user_id, use_cache)
+
+def _botResponse(user_query, conversation_id, user_id, use_cache):
     _initialize_conversation(user_id, conversation_id)
+    scope = _cacheScope(conversation_id, user_id) if use_cache else None
+    cached = _cachedAnswer(scope, user_query, conversation_id, user_id)
+    if cached is not None:
+        return cached
     
     conversations[conversation_id].append({"role": "user", "content": user_query})
 
     try:
         # Initial response with tool calls
-        response = client.chat.completions.create(
-            messages=conversations[conversation_id],
-            model = "llama-3.3-70b-versatile",
-            tools=my_local_tools,
-            tool_choice="auto",
-        )
+        with metrics.span("llm.first"):
+            response = client.chat.completions.create(
+                messages=_prompt(conversation_id, user_id),
+                model = "llama-3.3-70b-versatile",
+                tools=my_local_tools,
+                tool_choice="auto",
+            )
         
         
         tool_calls = response.choices[0].message.tool_calls
         
         if not tool_calls and len(response.choices[0].message.content) < 70 and len(response.choices[0].message.content) > 35:
-            tool_calls = get_tool(response.choices[0].message.content)
+            with metrics.span("get_tool"):
+                tool_calls = get_tool(response.choices[0].message.content)
             if tool_calls:
                 response.choices[0].message.tool_calls = tool_calls
                 response.choices[0].finish_reason = "tool_calls"
                 response.choices[0].message.content = None
         
         if tool_calls:  
-            return _handleTools(tool_calls, conversation_id, user_id)
+            res = _handleTools(tool_calls, conversation_id, user_id)
+        else:
+            res = response.choices[0].message.content
+            conversations[conversation_id].append({"role": "assistant", "content": res})
+            save_conversation_to_supabase(conversation_id, user_id)
+        _remember(scope, user_query, conversation_id, tool_calls)
+        return res
+    
+    except Exception as e:
+        return str(e)
+
+def _collectToolCalls(partial):
+    return [
+        ChatCompletionMessageToolCall(
+            id=call["id"],
+            function=Function(name=call["name"], arguments=call["arguments"] or "{}"),
+            type="function",
+        )
+        for _, call in sorted(partial.items())
+    ]
+
+def stream_bot_response(user_query, conversation_id, user_id, use_cache=True):
+    """
+    Streaming variant of get_bot_response.
+
+    Yields event dicts: tool_start/tool_end while tools run, token for each
+    piece of the final answer, then done (or error). The conversation is
+    persisted once the answer has finished streaming, before done is sent.
+    The conversation stays locked until the stream ends or is closed.
+    """
+    try:
+        with conversations.lock(conversation_id):
+            yield from _streamBotResponse(user_query, conversation_id, user_id, use_cache)
+    except LockTimeout as e:
+        yield {"event": "error", "message": str(e)}
+
+def _streamBotResponse(user_query, conversation_id, user_id, use_cache):
+    started = time.perf_counter()
+    ttft = None
+    _initialize_conversation(user_id, conversation_id)
+    scope = _cacheScope(conversation_id, user_id) if use_cache else None
+    cached = _cachedAnswer(scope, user_query, conversation_id, user_id)
+    if cached is not None:
+        total = time.perf_counter() - started
+        total_ms = round(total * 1000)
+        metrics.observe("luna_ttft_seconds", total, source="cache")
+        yield {"event": "token", "text": cached}
+        yield {"event": "done", "ttft_ms": total_ms, "total_ms": total_ms, "cached": True}
+        return
+    
+    conversations[conversation_id].append({"role": "user", "content": user_query})
+
+    try:
+        with metrics.span("llm.first", stream=True):
+            stream = client.chat.completions.create(
+                messages=_prompt(conversation_id, user_id),
+                model = "llama-3.3-70b-versatile",
+                tools=my_local_tools,
+                tool_choice="auto",
+                stream=True,
+            )
+        
+            # Hold back the first 70 chars: short replies may be a pseudo tool call for get_tool.
+            content = ""
+            flushed = 0
+            partial_calls = {}
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                for tc in delta.tool_calls or []:
+                    call = partial_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                    if tc.id:
+                        call["id"] = tc.id
+                    if tc.function and tc.function.name:
+                        call["name"] += tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call["arguments"] += tc.function.arguments
+                if delta.content:
+                    content += delta.content
+                    if not partial_calls and len(content) >= 70:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        yield {"event": "token", "text": content[flushed:]}
+                        flushed = len(content)
+        
+        tool_calls = _collectToolCalls(partial_calls) if partial_calls else None
+        if not tool_calls and not flushed and 35 < len(content) < 70:
+            with metrics.span("get_tool"):
+                tool_calls = get_tool(content)
+        
+        if tool_calls:
+            try:
+                qr_tool = yield from _runTools(tool_calls, conversation_id)
+            except ToolError as e:
+                yield {"event": "error", "message": str(e)}
+                return
+            
+            content = ""
+            with metrics.span("llm.final", stream=True):
+                stream = client.chat.completions.create(
+                    messages=_prompt(conversation_id, user_id),
+                    model = "llama-3.3-70b-versatile",
+                    stream=True,
+                )
+                for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    content += chunk.choices[0].delta.content
+                    yield {"event": "token", "text": chunk.choices[0].delta.content}
             
+            if qr_tool:
+                content += _qrImage(qr_tool)
+                yield {"event": "token", "text": _qrImage(qr_tool)}
+        elif flushed < len(content):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            yield {"event": "token", "text": content[flushed:]}
         
-        res = response.choices[0].message.content
-        conversations[conversation_id].append({"role": "assistant", "content": res})
+        conversations[conversation_id].append({"role": "assistant", "content": content})
         save_conversation_to_supabase(conversation_id, user_id)
-        return res
+        _remember(scope, user_query, conversation_id, tool_calls)
+        total = time.perf_counter() - started
+        ttft = ttft if ttft is not None else total
+        metrics.observe("luna_ttft_seconds", ttft, source="llm")
+        yield {"event": "done", "ttft_ms": round(ttft * 1000), "total_ms": round(total * 1000)}
     
     except Exception as e:
-        return str(e)
\ No newline at end of file
+        yield {"event": "error", "message": str(e)}
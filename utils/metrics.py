@@ -0,0 +1,167 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+
+# Timing spans and Prometheus-format metrics.
+#
+# A span times one stage (a Groq call, a tool, a db write) and records it in
+# the luna_stage_seconds histogram; spans opened inside another span become
+# its children, so each request builds a tree. Requests slower than
+# SLOW_REQUEST_MS (unset: off) print that tree. The current span lives in a
+# context variable; work handed to a thread pool keeps its parent through
+# carry().
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current = contextvars.ContextVar("span", default=None)
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_counters = {}  # (name, labels) -> value
+_HELP = {
+    "luna_request_seconds": ("histogram", "HTTP request latency by endpoint"),
+    "luna_stage_seconds": ("histogram", "Latency of each pipeline stage"),
+    "luna_ttft_seconds": ("histogram", "Time to the first streamed answer token, by source"),
+    "luna_requests_total": ("counter", "HTTP requests by endpoint and status"),
+    "luna_stage_errors_total": ("counter", "Stages that raised"),
+    "luna_llm_tokens_total": ("counter", "Groq tokens used, by model and kind"),
+    "luna_tool_tokens_saved_total": ("counter", "Tool output tokens removed by compaction"),
+    "luna_cache_hits_total": ("counter", "Cache hits"),
+    "luna_cache_misses_total": ("counter", "Cache misses"),
+    "luna_cache_hit_ratio": ("gauge", "Cache hit ratio since start"),
+    "luna_cache_entries": ("gauge", "Entries held by each cache"),
+}
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name: str, seconds: float, **labels) -> None:
+    key = (name, _labels(labels))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+class Span:
+    def __init__(self, name: str, parent=None, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.children = []
+        self.error = None
+        self.start = time.perf_counter()
+        self.duration = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def finish(self) -> float:
+        self.duration = time.perf_counter() - self.start
+        return self.duration
+
+    def tree(self, depth: int = 0) -> str:
+        took = f"{self.duration * 1000:.0f}ms" if self.duration is not None else "running"
+        attrs = "".join(f" {k}={v}" for k, v in self.attrs.items())
+        line = f"{'  ' * depth}{self.name} {took}{attrs}{' ERROR ' + self.error if self.error else ''}"
+        return "\n".join([line] + [child.tree(depth + 1) for child in self.children])
+
+class span:
+    """Context manager and decorator timing one stage under the current span."""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> Span:
+        self._span = Span(self.name, _current.get(), **self.attrs)
+        self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        observe("luna_stage_seconds", self._span.finish(), stage=self.name)
+        if exc is not None:
+            self._span.error = f"{exc_type.__name__}: {exc}"
+            inc("luna_stage_errors_total", stage=self.name)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name, **self.attrs):
+                return func(*args, **kwargs)
+        return wrapper
+
+def current():
+    return _current.get()
+
+def carry(func):
+    """Bind func to the caller's context so spans it opens on another thread join the caller's tree."""
+    return functools.partial(contextvars.copy_context().run, func)
+
+def startRequest(endpoint: str) -> None:
+    _current.set(Span(endpoint))
+
+def endRequest(root: Span, endpoint: str, status: int) -> None:
+    if root is None or root.duration is not None:
+        return
+    seconds = root.finish()
+    observe("luna_request_seconds", seconds, endpoint=endpoint)
+    inc("luna_requests_total", endpoint=endpoint, status=status)
+    if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+        print(f"Slow request ({seconds * 1000:.0f}ms):\n{root.tree()}")
+
+def countTokens(model: str, usage) -> None:
+    if usage is None:
+        return
+    inc("luna_llm_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+    inc("luna_llm_tokens_total", getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+def _format(name: str, labels: tuple, value) -> str:
+    inner = ",".join(f'{k}="{v}"' for k, v in labels)
+    return f"{name}{{{inner}}} {value}" if inner else f"{name} {value}"
+
+def render(caches: dict = None) -> str:
+    """Prometheus text exposition; caches maps a cache name to its stats() dict."""
+    counters = dict(_counters)
+    gauges = {}
+    for cache, stats in (caches or {}).items():
+        if not stats:
+            continue
+        labels = (("cache", cache),)
+        if "hits" in stats:
+            counters[("luna_cache_hits_total", labels)] = stats["hits"]
+            counters[("luna_cache_misses_total", labels)] = stats.get("misses", 0)
+        if "hit_rate" in stats:
+            gauges[("luna_cache_hit_ratio", labels)] = stats["hit_rate"]
+        if "size" in stats:
+            gauges[("luna_cache_entries", labels)] = stats["size"]
+
+    lines = []
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    for name in _HELP:
+        kind, help_text = _HELP[name]
+        series = [(k, v) for k, v in list(counters.items()) + list(gauges.items()) if k[0] == name]
+        hist = [(k, v) for k, v in histograms.items() if k[0] == name]
+        if not series and not hist:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (_, labels), value in sorted(series):
+            lines.append(_format(name, labels, value))
+        for (_, labels), h in sorted(hist):
+            for bound, count in zip(BUCKETS, h):
+                lines.append(_format(f"{name}_bucket", labels + (("le", bound),), count))
+            lines.append(_format(f"{name}_bucket", labels + (("le", "+Inf"),), h[-1]))
+            lines.append(_format(f"{name}_sum", labels, round(h[-2], 6)))
+            lines.append(_format(f"{name}_count", labels, h[-1]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,297 @@
+import base64
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from utils.cache import TTLCache
+
+# Conversation persistence backends, selected with PERSISTENCE_MODE:
+#
+#   array  - one row per conversation in `conversations`, whole messages array
+#            upserted on every save (the original behaviour)
+#   delta  - messages appended as rows of `conversation_messages`
+#            (conversation_id, user_id, seq, message), primary key
+#            (conversation_id, seq); `conversations` keeps a header row
+#   sqlite - the delta layout in a local sqlite file, for offline use and tests
+#
+# Every save also maintains summary columns on the `conversations` row
+# (title, message_count, updated_at), so the history listing is served from
+# those alone and never reads message bodies. Supabase needs matching columns
+# and an index on (user_id, updated_at desc, conversation_id desc); see
+# migrations/001_conversation_summaries.sql. Delta mode on Supabase also needs
+# the `conversation_messages` table from migrations/002_conversation_messages.sql.
+
+SUMMARY_COLUMNS = "conversation_id, title, message_count, updated_at"
+TITLE_CHARS = 80
+
+def summary(conversation_id: str, user_id: str, messages: list) -> dict:
+    first = next((m for m in messages if m.get("role") == "user"), None)
+    return {
+        "conversation_id": conversation_id,
+        "user_id": user_id,
+        "title": str(first.get("content") or "")[:TITLE_CHARS] if first else "",
+        "message_count": len(messages),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+def encodeCursor(row: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([row["updated_at"], row["conversation_id"]]).encode()).decode()
+
+class InvalidCursor(ValueError):
+    pass
+
+def decodeCursor(cursor: str):
+    if not cursor:
+        return None
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if not (isinstance(after, list) and len(after) == 2 and all(isinstance(v, str) for v in after)):
+        raise InvalidCursor("Invalid cursor")
+    return after
+
+def _page(rows: list, limit: int) -> dict:
+    """rows were fetched with limit + 1 to learn whether another page exists."""
+    return {
+        "conversations": rows[:limit],
+        "next_cursor": encodeCursor(rows[limit - 1]) if len(rows) > limit else None,
+    }
+
+def _supabaseList(supabase, user_id: str, limit: int, cursor: str) -> dict:
+    query = supabase.table("conversations")\
+        .select(SUMMARY_COLUMNS)\
+        .eq("user_id", user_id)
+    after = decodeCursor(cursor)
+    if after:
+        updated_at, conversation_id = after
+        query = query.or_(
+            f'updated_at.lt."{updated_at}",and(updated_at.eq."{updated_at}",conversation_id.lt."{conversation_id}")'
+        )
+    res = query.order("updated_at", desc=True)\
+        .order("conversation_id", desc=True)\
+        .limit(limit + 1)\
+        .execute()
+    return _page(res.data, limit)
+
+class ArrayBackend:
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def load(self, conversation_id: str, user_id: str):
+        res = self.supabase.table("conversations")\
+            .select("*")\
+            .eq("conversation_id", conversation_id)\
+            .eq("user_id", user_id)\
+            .execute()
+        if res.data:
+            return res.data[0]["messages"]
+
+    def save(self, conversation_id: str, user_id: str, messages: list) -> None:
+        self.supabase.table("conversations").upsert(
+            dict(summary(conversation_id, user_id, messages), messages=messages)
+        ).execute()
+
+    def truncate(self, conversation_id: str, user_id: str, length: int, messages: list) -> None:
+        # Nothing to do up front; the save that follows rewrites the whole array
+        pass
+
+    def delete(self, conversation_id: str, user_id: str) -> None:
+        self.supabase.table("conversations").delete()\
+            .eq("conversation_id", conversation_id)\
+            .eq("user_id", user_id).execute()
+
+    def delete_user(self, user_id: str) -> None:
+        self.supabase.table("conversations").delete().eq("user_id", user_id).execute()
+
+    def list(self, user_id: str, limit: int = 50, cursor: str = None) -> dict:
+        return _supabaseList(self.supabase, user_id, limit, cursor)
+
+class DeltaBackend:
+    """
+    Append-only persistence: each save writes only the messages past the
+    last persisted sequence number, and a truncation is a ranged delete.
+    """
+
+    def __init__(self):
+        # conversation_id -> number of messages already persisted
+        self._persisted = TTLCache(maxsize=10000, ttl=float("inf"))
+
+    def _count(self, conversation_id: str, user_id: str) -> int:
+        count = self._persisted.get(conversation_id)
+        if count is None:
+            count = self._stored_count(conversation_id, user_id)
+            self._persisted.set(conversation_id, count)
+        return count
+
+    def load(self, conversation_id: str, user_id: str):
+        messages = self._load_rows(conversation_id, user_id)
+        if messages:
+            self._persisted.set(conversation_id, len(messages))
+            return messages
+
+    def save(self, conversation_id: str, user_id: str, messages: list) -> None:
+        count = self._count(conversation_id, user_id)
+        if len(messages) < count:
+            # Another worker may have truncated since our count was cached; trust the table
+            count = self._stored_count(conversation_id, user_id)
+        if len(messages) == count:
+            self._persisted.set(conversation_id, count)
+            return
+        if len(messages) < count:
+            self._delete_from(conversation_id, user_id, len(messages))
+            count = len(messages)
+        if len(messages) > count:
+            rows = [
+                {"conversation_id": conversation_id, "user_id": user_id, "seq": seq, "message": messages[seq]}
+                for seq in range(count, len(messages))
+            ]
+            self._append_rows(conversation_id, user_id, rows)
+        self._write_summary(summary(conversation_id, user_id, messages))
+        self._persisted.set(conversation_id, len(messages))
+
+    def truncate(self, conversation_id: str, user_id: str, length: int, messages: list = None) -> None:
+        self._delete_from(conversation_id, user_id, length)
+        self._write_summary(summary(conversation_id, user_id, (messages or [])[:length]))
+        self._persisted.set(conversation_id, length)
+
+    def delete(self, conversation_id: str, user_id: str) -> None:
+        self._persisted.pop(conversation_id)
+        self._delete_conversation(conversation_id, user_id)
+
+class SupabaseDeltaBackend(DeltaBackend):
+    def __init__(self, supabase):
+        super().__init__()
+        self.supabase = supabase
+
+    def _stored_count(self, conversation_id, user_id):
+        res = self.supabase.table("conversation_messages")\
+            .select("seq")\
+            .eq("conversation_id", conversation_id)\
+            .order("seq", desc=True)\
+            .limit(1)\
+            .execute()
+        return res.data[0]["seq"] + 1 if res.data else 0
+
+    def _load_rows(self, conversation_id, user_id):
+        res = self.supabase.table("conversation_messages")\
+            .select("message")\
+            .eq("conversation_id", conversation_id)\
+            .eq("user_id", user_id)\
+            .order("seq")\
+            .execute()
+        return [row["message"] for row in res.data]
+
+    def _append_rows(self, conversation_id, user_id, rows):
+        self.supabase.table("conversation_messages").upsert(rows).execute()
+
+    def _write_summary(self, row):
+        self.supabase.table("conversations").upsert(row).execute()
+
+    def _delete_from(self, conversation_id, user_id, seq):
+        self.supabase.table("conversation_messages").delete()\
+            .eq("conversation_id", conversation_id)\
+            .eq("user_id", user_id)\
+            .gte("seq", seq)\
+            .execute()
+
+    def _delete_conversation(self, conversation_id, user_id):
+        self._delete_from(conversation_id, user_id, 0)
+        self.supabase.table("conversations").delete()\
+            .eq("conversation_id", conversation_id)\
+            .eq("user_id", user_id).execute()
+
+    def delete_user(self, user_id: str) -> None:
+        self.supabase.table("conversation_messages").delete().eq("user_id", user_id).execute()
+        self.supabase.table("conversations").delete().eq("user_id", user_id).execute()
+        self._persisted.clear()
+
+    def list(self, user_id: str, limit: int = 50, cursor: str = None) -> dict:
+        return _supabaseList(self.supabase, user_id, limit, cursor)
+
+class SQLiteBackend(DeltaBackend):
+    """Local stand-in for SupabaseDeltaBackend, stored in a single sqlite file."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_messages ("
+            "conversation_id TEXT, user_id TEXT, seq INTEGER, message TEXT, "
+            "PRIMARY KEY (conversation_id, seq))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversation_messages_user ON conversation_messages (user_id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "conversation_id TEXT PRIMARY KEY, user_id TEXT, title TEXT, message_count INTEGER, updated_at TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversations_user ON conversations (user_id, updated_at, conversation_id)")
+        self._db.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+            self._db.commit()
+            return rows
+
+    def _stored_count(self, conversation_id, user_id):
+        rows = self._query("SELECT MAX(seq) FROM conversation_messages WHERE conversation_id = ?", (conversation_id,))
+        return rows[0][0] + 1 if rows and rows[0][0] is not None else 0
+
+    def _load_rows(self, conversation_id, user_id):
+        rows = self._query(
+            "SELECT message FROM conversation_messages WHERE conversation_id = ? AND user_id = ? ORDER BY seq",
+            (conversation_id, user_id),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def _append_rows(self, conversation_id, user_id, rows):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO conversation_messages VALUES (?, ?, ?, ?)",
+                [(r["conversation_id"], r["user_id"], r["seq"], json.dumps(r["message"])) for r in rows],
+            )
+            self._db.commit()
+
+    def _delete_from(self, conversation_id, user_id, seq):
+        self._query(
+            "DELETE FROM conversation_messages WHERE conversation_id = ? AND user_id = ? AND seq >= ?",
+            (conversation_id, user_id, seq),
+        )
+
+    def _write_summary(self, row):
+        self._query(
+            "INSERT OR REPLACE INTO conversations VALUES (?, ?, ?, ?, ?)",
+            (row["conversation_id"], row["user_id"], row["title"], row["message_count"], row["updated_at"]),
+        )
+
+    def _delete_conversation(self, conversation_id, user_id):
+        self._delete_from(conversation_id, user_id, 0)
+        self._query("DELETE FROM conversations WHERE conversation_id = ? AND user_id = ?", (conversation_id, user_id))
+
+    def delete_user(self, user_id: str) -> None:
+        self._query("DELETE FROM conversation_messages WHERE user_id = ?", (user_id,))
+        self._query("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+        self._persisted.clear()
+
+    def list(self, user_id: str, limit: int = 50, cursor: str = None) -> dict:
+        after = decodeCursor(cursor)
+        where, params = "user_id = ?", [user_id]
+        if after:
+            where += " AND (updated_at < ? OR (updated_at = ? AND conversation_id < ?))"
+            params += [after[0], after[0], after[1]]
+        rows = self._query(
+            f"SELECT {SUMMARY_COLUMNS} FROM conversations WHERE {where} "
+            "ORDER BY updated_at DESC, conversation_id DESC LIMIT ?",
+            params + [limit + 1],
+        )
+        keys = [c.strip() for c in SUMMARY_COLUMNS.split(",")]
+        return _page([dict(zip(keys, row)) for row in rows], limit)
+
+def createBackend(mode: str, supabase=None, sqlite_path: str = "conversations.sqlite"):
+    if mode == "delta":
+        return SupabaseDeltaBackend(supabase)
+    if mode == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    return ArrayBackend(supabase)
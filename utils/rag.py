@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Document retrieval for uploaded files.
+#
+# Uploads are chunked and embedded in a background thread, then appended to a
+# per-user index under RAG_INDEX_DIR/<sha256 of user id>/ (hashed, so no id
+# can name a path outside the index directory):
+#   vectors.f32  - float32 rows of RAG_DIM, read back with np.memmap
+#   chunks.jsonl - one {"text", "source"} line per row
+#   meta.json    - {"dim", "count", "chunks_bytes"}; rewritten last, so readers
+#                  never see a partial batch
+# Embeddings come from a signed hashing vectoriser over words and word
+# bigrams, or from a local sentence-transformers model if RAG_EMBED_MODEL is set.
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "rag_index")
+RAG_DIM = int(os.getenv("RAG_DIM", "1024"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.1"))
+CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "800"))
+CHUNK_OVERLAP = 100
+EMBED_BATCH = 256
+
+_model = None
+if os.getenv("RAG_EMBED_MODEL"):
+    try:
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(os.getenv("RAG_EMBED_MODEL"), device="cpu")
+        RAG_DIM = _model.get_sentence_embedding_dimension()
+    except ImportError:
+        print("RAG_EMBED_MODEL is set but sentence-transformers is not installed; using the hashing vectoriser")
+
+_ingest_pool = ThreadPoolExecutor(max_workers=int(os.getenv("RAG_INGEST_WORKERS", "1")), thread_name_prefix="rag-ingest")
+_user_locks = {}
+_locks_lock = threading.Lock()
+# Bumped by removeContext; ingestions started under an older generation stop
+_generations = {}
+_jobs = {}
+_indexes = {}  # user_id -> (count, vectors memmap, chunks)
+
+_WORD = re.compile(r"\w+")
+
+def _userDir(user_id: str) -> str:
+    return os.path.join(RAG_INDEX_DIR, hashlib.sha256(user_id.encode()).hexdigest())
+
+def _userLock(user_id: str) -> threading.Lock:
+    with _locks_lock:
+        return _user_locks.setdefault(user_id, threading.Lock())
+
+def _hashEmbed(text: str) -> np.ndarray:
+    vector = np.zeros(RAG_DIM, dtype=np.float32)
+    words = _WORD.findall(text.lower())
+    for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+        h = zlib.crc32(feature.encode())
+        vector[h % RAG_DIM] += 1.0 if h & 0x80000000 else -1.0
+    return vector
+
+def embed(texts: list) -> np.ndarray:
+    if _model is not None:
+        return _model.encode(texts, normalize_embeddings=True).astype(np.float32)
+    vectors = np.stack([_hashEmbed(t) for t in texts]) if texts else np.zeros((0, RAG_DIM), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+def _readText(path: str, filename: str):
+    """Yield the document's text piece by piece (a page or a block of lines)."""
+    if filename.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        for page in PdfReader(path).pages:
+            yield page.extract_text() or ""
+        return
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        block = []
+        for line in f:
+            block.append(line)
+            if len(block) >= 200:
+                yield "".join(block)
+                block = []
+        yield "".join(block)
+
+def chunkText(pieces):
+    """Split streamed text into ~CHUNK_CHARS chunks with a small overlap, preferring paragraph breaks."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= CHUNK_CHARS:
+            cut = buffer.rfind("\n\n", CHUNK_CHARS // 2, CHUNK_CHARS)
+            if cut == -1:
+                cut = buffer.rfind(" ", CHUNK_CHARS // 2, CHUNK_CHARS)
+            if cut == -1:
+                cut = CHUNK_CHARS
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield chunk
+            buffer = buffer[max(cut - CHUNK_OVERLAP, 1):]
+    if buffer.strip():
+        yield buffer.strip()
+
+class IngestCancelled(Exception):
+    pass
+
+def _append(user_id: str, chunks: list, source: str, generation: int) -> None:
+    if _generations.get(user_id, 0) != generation:
+        raise IngestCancelled()
+    # Embed without the lock; it is only held while the files are written
+    vectors = embed(chunks)
+    with _userLock(user_id):
+        if _generations.get(user_id, 0) != generation:
+            raise IngestCancelled()
+        _write(user_id, chunks, vectors, source)
+
+def _write(user_id: str, chunks: list, vectors: np.ndarray, source: str) -> None:
+    directory = _userDir(user_id)
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, "meta.json")
+    meta = {"dim": RAG_DIM, "count": 0, "chunks_bytes": 0}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    # Both files are cut back to the committed size first, dropping anything a crashed ingestion left behind
+    with open(os.path.join(directory, "vectors.f32"), "r+b" if meta["count"] else "wb") as f:
+        f.truncate(meta["count"] * RAG_DIM * 4)
+        f.seek(0, os.SEEK_END)
+        f.write(vectors.tobytes())
+    with open(os.path.join(directory, "chunks.jsonl"), "r+b" if meta["count"] else "wb") as f:
+        f.truncate(meta["chunks_bytes"])
+        f.seek(0, os.SEEK_END)
+        for chunk in chunks:
+            f.write((json.dumps({"text": chunk, "source": source}) + "\n").encode("utf-8"))
+        meta["chunks_bytes"] = f.tell()
+    meta["count"] += len(chunks)
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+def _ingest(job_id: str, user_id: str, path: str, filename: str, generation: int) -> None:
+    _jobs[job_id]["status"] = "indexing"
+    try:
+        batch = []
+        for chunk in chunkText(_readText(path, filename)):
+            batch.append(chunk)
+            if len(batch) >= EMBED_BATCH:
+                _append(user_id, batch, filename, generation)
+                _jobs[job_id]["chunks"] += len(batch)
+                batch = []
+        if batch:
+            _append(user_id, batch, filename, generation)
+            _jobs[job_id]["chunks"] += len(batch)
+        _jobs[job_id]["status"] = "done"
+    except IngestCancelled:
+        _jobs[job_id]["status"] = "cancelled"
+    except Exception as e:
+        print(f"Error indexing {filename}: {str(e)}")
+        _jobs[job_id].update(status="failed", error=str(e))
+    finally:
+        os.remove(path)
+
+def ingest(user_id: str, file_storage) -> str:
+    """Save an uploaded file and index it in the background; returns the job id."""
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(file_storage.filename or "")[1])
+    with os.fdopen(fd, "wb") as f:
+        shutil.copyfileobj(file_storage.stream, f, 1024 * 1024)
+    job_id = os.path.basename(path)
+    while len(_jobs) >= 1000:
+        _jobs.pop(next(iter(_jobs)))
+    _jobs[job_id] = {"user_id": user_id, "file": file_storage.filename, "status": "queued", "chunks": 0}
+    _ingest_pool.submit(_ingest, job_id, user_id, path, file_storage.filename or "upload.txt", _generations.get(user_id, 0))
+    return job_id
+
+def job(job_id: str):
+    return _jobs.get(job_id)
+
+def _load(user_id: str):
+    meta_path = os.path.join(_userDir(user_id), "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta["dim"] != RAG_DIM or not meta["count"]:
+        return None
+    cached = _indexes.get(user_id)
+    if cached and cached[0] == meta["count"]:
+        return cached
+    vectors = np.memmap(os.path.join(_userDir(user_id), "vectors.f32"), dtype=np.float32, mode="r", shape=(meta["count"], RAG_DIM))
+    with open(os.path.join(_userDir(user_id), "chunks.jsonl"), encoding="utf-8") as f:
+        chunks = [json.loads(line) for _, line in zip(range(meta["count"]), f)]
+    _indexes[user_id] = (meta["count"], vectors, chunks)
+    return _indexes[user_id]
+
+def hasContext(user_id: str) -> bool:
+    return _load(user_id) is not None
+
+def retrieve(user_id: str, query: str, k: int = None) -> list:
+    """Top-k chunks for query from the user's documents, best first."""
+    index = _load(user_id)
+    if index is None or not query:
+        return []
+    _, vectors, chunks = index
+    scores = vectors @ embed([query])[0]
+    k = min(k or RAG_TOP_K, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [dict(chunks[i], score=float(scores[i])) for i in top if scores[i] >= RAG_MIN_SCORE]
+
+def removeContext(user_id: str) -> None:
+    """Delete the user's index and cancel their running or queued ingestions."""
+    with _userLock(user_id):
+        _generations[user_id] = _generations.get(user_id, 0) + 1
+        _indexes.pop(user_id, None)
+        shutil.rmtree(_userDir(user_id), ignore_errors=True)
@@ -1,11 +1,32 @@
-from flask import Blueprint, request, jsonify, render_template
+import json
+from flask import Blueprint, request, jsonify, render_template, Response, stream_with_context, send_file
 from utils.logic import (
     get_bot_response,
+    stream_bot_response,
     _initialize_conversation,
     switchKey,
 )
-from utils.db import (conversations, save_conversation_to_supabase, supabase)
+from utils.db import (
+    conversations,
+    truncate_conversation_in_supabase,
+    delete_conversation_from_supabase,
+    delete_user_conversations_from_supabase,
+    list_conversations_from_supabase,
+    writer,
+)
+from utils.searchIndex import search_index
+from utils.sharedState import LockTimeout
+from utils.persistence import decodeCursor
 from utils.systemPrompt import (get_sys_prompt, set_sys_prompt)
+from utils import systemPrompt
+from utils.context import forget
+from utils import rag
+from utils import answerCache
+from utils import metrics
+from utils import blobStore
+from utils import compaction
+from utils.groqPool import pool
+from tools import pageCache, googleSearch, parseTool
 
 routes_blueprint = Blueprint("routes_blueprint", __name__)
 
@@ -20,12 +41,33 @@ def chat():
         user_id = request.form.get("user_id", "default")
         conversation_id = request.form.get("conversation_id", "default")
         message = request.form.get("message", "")
-        response = get_bot_response(message, conversation_id, user_id)
+        use_cache = request.form.get("cache", "1") != "0"
+        response = get_bot_response(message, conversation_id, user_id, use_cache)
         return jsonify({"response": response}), 200
+    except LockTimeout as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         print(f"Chat error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@routes_blueprint.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    # Same form fields as /chat (cache=0 skips the answer cache), answered as server-sent events
+    user_id = request.form.get("user_id", "default")
+    conversation_id = request.form.get("conversation_id", "default")
+    message = request.form.get("message", "")
+    use_cache = request.form.get("cache", "1") != "0"
+
+    def events():
+        for event in stream_bot_response(message, conversation_id, user_id, use_cache):
+            yield f"event: {event.pop('event')}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @routes_blueprint.route("/delete", methods=["DELETE"])
 def clear_history():
     try:
@@ -35,7 +77,8 @@ def clear_history():
         keys_to_delete = [k for k, v in conversations.items() if v and v[0].get("user_id", user_id) == user_id]
         for key in keys_to_delete:
             conversations.pop(key, None)
-        supabase.table("conversations").delete().eq("user_id", user_id).execute()
+            forget(key)
+        delete_user_conversations_from_supabase(user_id)
         return jsonify({"message": "All conversations deleted for the user"}), 200
     except Exception as e:
         print(f"Clear history error: {str(e)}")
@@ -46,9 +89,8 @@ def delete_conversation(conversation_id):
     try:
         user_id = request.args.get("user_id", "default")
         conversations.pop(conversation_id, None)
-        supabase.table("conversations").delete()\
-            .eq("conversation_id", conversation_id)\
-            .eq("user_id", user_id).execute()
+        forget(conversation_id)
+        delete_conversation_from_supabase(conversation_id, user_id)
         return jsonify({"message": "Conversation deleted"}), 200
     except Exception as e:
         print(f"Delete conversation error: {str(e)}")
@@ -63,29 +105,27 @@ def delete_message(conversation_id, idx):
         return jsonify({"error": "Index must be an integer"}), 400
 
     try:
-        if conversation_id not in conversations:
-            from utils.db import get_conversation_from_supabase
-            messages = get_conversation_from_supabase(conversation_id, user_id)
-            if messages:
-                conversations[conversation_id] = messages
-            else:
+        with conversations.lock(conversation_id):
+            if not conversations.load(conversation_id, user_id):
                 return jsonify({"error": "Conversation not found"}), 404
 
-        count = 0
-        delete_index = None
-        for i, msg in enumerate(conversations[conversation_id]):
-            if msg.get("role") == "user":
-                count += 1
-            if count == idx:
-                delete_index = i
-                break
+            count = 0
+            delete_index = None
+            for i, msg in enumerate(conversations[conversation_id]):
+                if msg.get("role") == "user":
+                    count += 1
+                if count == idx:
+                    delete_index = i
+                    break
 
-        if delete_index is None:
-            return jsonify({"error": "Invalid index"}), 400
+            if delete_index is None:
+                return jsonify({"error": "Invalid index"}), 400
 
-        conversations[conversation_id] = conversations[conversation_id][:delete_index]
-        save_conversation_to_supabase(conversation_id, user_id)
+            conversations[conversation_id] = conversations[conversation_id][:delete_index]
+            truncate_conversation_in_supabase(conversation_id, user_id, delete_index)
         return jsonify({"message": "Messages after the given index deleted"}), 200
+    except LockTimeout as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         print(f"Delete message error: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -94,12 +134,27 @@ def delete_message(conversation_id, idx):
 def list_history():
     try:
         user_id = request.args.get("user_id", "default")
-        res = supabase.table("conversations").select("*").eq("user_id", user_id).execute()
-        return jsonify(res.data), 200
+        cursor = request.args.get("cursor")
+        limit = max(1, min(int(request.args.get("limit", 50)), 200))
+        decodeCursor(cursor)
+        return jsonify(list_conversations_from_supabase(user_id, cursor, limit)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"List history error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@routes_blueprint.route("/history/search")
+def search_history():
+    try:
+        user_id = request.args.get("user_id", "default")
+        query = request.args.get("q", "")
+        limit = min(int(request.args.get("limit", 20)), 100)
+        return jsonify(search_index.search(user_id, query, limit)), 200
+    except Exception as e:
+        print(f"Search history error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @routes_blueprint.route("/history/<conversation_id>")
 def get_history(conversation_id):
     try:
@@ -137,4 +192,82 @@ def switch_api():
         return jsonify({"message": "API key switched"}), 200
     except Exception as e:
         print(f"Switch API error: {str(e)}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@routes_blueprint.route("/upload", methods=["POST"])
+def upload():
+    try:
+        user_id = request.form.get("user_id", "default")
+        file = request.files.get("file")
+        if not file or not file.filename:
+            return jsonify({"error": "No file provided"}), 400
+        job_id = rag.ingest(user_id, file)
+        return jsonify({"message": f"{file.filename} uploaded, indexing in background", "job_id": job_id}), 202
+    except Exception as e:
+        print(f"Upload error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@routes_blueprint.route("/upload/<job_id>")
+def upload_status(job_id):
+    job = rag.job(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job), 200
+
+@routes_blueprint.route("/check-context")
+def check_context():
+    try:
+        user_id = request.args.get("user_id", "default")
+        return jsonify({"message": rag.hasContext(user_id)}), 200
+    except Exception as e:
+        print(f"Check context error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@routes_blueprint.route("/remove-context")
+def remove_context():
+    try:
+        user_id = request.args.get("user_id", "default")
+        rag.removeContext(user_id)
+        return jsonify({"message": "Context removed"}), 200
+    except Exception as e:
+        print(f"Remove context error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@routes_blueprint.route("/blob/<name>")
+def get_blob(name):
+    # Blobs are content-addressed, so a name's bytes never change
+    path = blobStore.path(name)
+    if path is None:
+        return jsonify({"error": "Blob not found"}), 404
+    response = send_file(path, mimetype=blobStore.mimetype(name), etag=name.split(".")[0], max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def _cacheStats() -> dict:
+    return {
+        "page": pageCache.stats(),
+        "search": googleSearch.stats(),
+        "conversations": conversations.stats(),
+        "system_prompt": systemPrompt.stats(),
+        "answer": answerCache.stats(),
+    }
+
+@routes_blueprint.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(_cacheStats()), mimetype="text/plain; version=0.0.4")
+
+@routes_blueprint.route("/stats")
+def cache_stats():
+    return jsonify({
+        "page_cache": pageCache.stats(),
+        "search_cache": googleSearch.stats(),
+        "conversations": conversations.stats(),
+        "write_behind": writer.stats() if writer else None,
+        "system_prompt_cache": systemPrompt.stats(),
+        "answer_cache": answerCache.stats(),
+        "tool_router": parseTool.stats(),
+        "groq_pool": pool.stats(),
+        "blobs": blobStore.stats(),
+        "tool_compaction": compaction.stats(),
+    }), 200
@@ -0,0 +1,114 @@
+import os
+import re
+import sqlite3
+import threading
+
+# Full-text index over user and assistant messages, kept in a local sqlite
+# FTS5 table (ranked with bm25) and updated incrementally on every save, so
+# it survives restarts without a rebuild. conversation_id is UNINDEXED in the
+# FTS table, so message_rows maps (conversation_id, idx) to the FTS rowid and
+# deletes go by rowid instead of scanning every user's messages.
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.sqlite")
+INDEXED_ROLES = ("user", "assistant")
+
+_IMG = re.compile(r"<img[^>]*>|data:image/[^\s'\")]+")
+_TOKEN = re.compile(r"\w+")
+
+class SearchIndex:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+            "user_id, content, conversation_id UNINDEXED, idx UNINDEXED, role UNINDEXED, "
+            "tokenize = 'porter unicode61')"
+        )
+        # How many messages of each conversation have been indexed
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS indexed (conversation_id TEXT PRIMARY KEY, user_id TEXT, count INTEGER)"
+        )
+        existed = self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'message_rows'").fetchone()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS message_rows ("
+            "conversation_id TEXT, idx INTEGER, fts_rowid INTEGER, PRIMARY KEY (conversation_id, idx)) WITHOUT ROWID"
+        )
+        if not existed:
+            # Index files from before message_rows: one scan to fill it
+            self._db.execute("INSERT OR IGNORE INTO message_rows SELECT conversation_id, idx, rowid FROM messages")
+        self._db.commit()
+
+    def _deleteFrom(self, conversation_id: str, idx: int) -> None:
+        rowids = self._db.execute(
+            "SELECT fts_rowid FROM message_rows WHERE conversation_id = ? AND idx >= ?", (conversation_id, idx)
+        ).fetchall()
+        self._db.executemany("DELETE FROM messages WHERE rowid = ?", rowids)
+        self._db.execute("DELETE FROM message_rows WHERE conversation_id = ? AND idx >= ?", (conversation_id, idx))
+
+    def update(self, conversation_id: str, user_id: str, messages: list) -> None:
+        with self._lock:
+            row = self._db.execute("SELECT count FROM indexed WHERE conversation_id = ?", (conversation_id,)).fetchone()
+            count = row[0] if row else 0
+            if len(messages) < count:
+                self._deleteFrom(conversation_id, len(messages))
+                count = len(messages)
+            rows = [
+                (user_id, _IMG.sub(" ", str(m.get("content") or "")), conversation_id, i, m.get("role"))
+                for i, m in enumerate(messages[count:], start=count)
+                if m.get("role") in INDEXED_ROLES and m.get("content")
+            ]
+            for row in rows:
+                rowid = self._db.execute(
+                    "INSERT INTO messages (user_id, content, conversation_id, idx, role) VALUES (?, ?, ?, ?, ?)", row
+                ).lastrowid
+                self._db.execute("INSERT OR REPLACE INTO message_rows VALUES (?, ?, ?)", (conversation_id, row[3], rowid))
+            self._db.execute(
+                "INSERT OR REPLACE INTO indexed VALUES (?, ?, ?)", (conversation_id, user_id, len(messages))
+            )
+            self._db.commit()
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._deleteFrom(conversation_id, 0)
+            self._db.execute("DELETE FROM indexed WHERE conversation_id = ?", (conversation_id,))
+            self._db.commit()
+
+    def delete_user(self, user_id: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM messages WHERE messages MATCH ? AND user_id = ?", (_phrase("user_id", user_id), user_id)
+            )
+            self._db.execute(
+                "DELETE FROM message_rows WHERE conversation_id IN (SELECT conversation_id FROM indexed WHERE user_id = ?)",
+                (user_id,),
+            )
+            self._db.execute("DELETE FROM indexed WHERE user_id = ?", (user_id,))
+            self._db.commit()
+
+    def search(self, user_id: str, query: str, limit: int = 20) -> list:
+        terms = _TOKEN.findall(query)
+        if not terms:
+            return []
+        results = []
+        # Every term must match; fall back to any term if that finds nothing
+        for joiner in (" AND ", " OR "):
+            match = f"{_phrase('user_id', user_id)} AND ({joiner.join(_phrase('content', t) for t in terms)})"
+            with self._lock:
+                results = self._db.execute(
+                    "SELECT conversation_id, idx, role, "
+                    "snippet(messages, 1, '<b>', '</b>', '...', 16), bm25(messages, 0.0, 1.0) "
+                    "FROM messages WHERE messages MATCH ? AND user_id = ? ORDER BY bm25(messages, 0.0, 1.0) LIMIT ?",
+                    (match, user_id, limit),
+                ).fetchall()
+            if results or len(terms) == 1:
+                break
+        return [
+            {"conversation_id": cid, "message_index": idx, "role": role, "snippet": snippet, "score": round(-score, 4)}
+            for cid, idx, role, snippet, score in results
+        ]
+
+def _phrase(column, text: str) -> str:
+    quoted = '"' + text.replace('"', '""') + '"'
+    return f"{column} : {quoted}" if column else quoted
+
+search_index = SearchIndex(SEARCH_INDEX_PATH)
@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Conversation state shared between gunicorn workers.
+#
+# Each conversation is stored as (version, user_id, messages). put() is a
+# compare-and-set on the version, so a worker holding a stale copy can't
+# overwrite a newer turn. lock() serialises turns on one conversation across
+# workers; the version check catches the case where a lock expired mid-turn.
+#
+#   redis - any Redis-protocol server at REDIS_URL (Redis, Valkey, KeyDB...)
+#   local - in-process stand-in with the same semantics, for tests and a
+#           single worker
+
+class StateConflict(Exception):
+    pass
+
+class LockTimeout(Exception):
+    pass
+
+class KeyedLock:
+    """Per-key locks that are dropped once nobody holds or waits on them."""
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def __call__(self, key: str, timeout: float):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(timeout=timeout):
+                raise LockTimeout(f"Conversation {key} is busy")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._locks.pop(key, None)
+
+class LocalState:
+    name = "local"
+
+    def __init__(self):
+        self._data = {}  # conversation_id -> (version, user_id, json)
+        self._guard = threading.Lock()
+        self._locks = KeyedLock()
+
+    def version(self, conversation_id: str) -> int:
+        return self._data.get(conversation_id, (0,))[0]
+
+    def get(self, conversation_id: str):
+        """(version, user_id, messages), or None if nothing is stored."""
+        entry = self._data.get(conversation_id)
+        if entry is None:
+            return None
+        return entry[0], entry[1], json.loads(entry[2])
+
+    def put(self, conversation_id: str, user_id: str, messages: list, expected: int) -> int:
+        with self._guard:
+            version = self.version(conversation_id)
+            if version != expected:
+                raise StateConflict(f"Conversation {conversation_id} is at version {version}, expected {expected}")
+            self._data[conversation_id] = (version + 1, user_id, json.dumps(messages))
+            return version + 1
+
+    def delete(self, conversation_id: str) -> None:
+        with self._guard:
+            self._data.pop(conversation_id, None)
+
+    def delete_user(self, user_id: str) -> None:
+        with self._guard:
+            for cid in [cid for cid, entry in self._data.items() if entry[1] == user_id]:
+                del self._data[cid]
+
+    def lock(self, conversation_id: str, timeout: float):
+        return self._locks(conversation_id, timeout)
+
+# KEYS: state, user set; ARGV: expected version, user_id, messages, ttl
+_PUT = """
+local version = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+if version ~= tonumber(ARGV[1]) then return -version - 1 end
+redis.call('HSET', KEYS[1], 'v', version + 1, 'user', ARGV[2], 'messages', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('SADD', KEYS[2], KEYS[1])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return version + 1
+"""
+
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+class RedisState:
+    """
+    Redis-protocol backend. State expires after ttl seconds idle and is then
+    reloaded from Supabase; locks expire after lock_ttl seconds so a killed
+    worker can't hold a conversation forever.
+    """
+    name = "redis"
+
+    def __init__(self, url: str, ttl: int = 86400, lock_ttl: int = 180, prefix: str = "luna"):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix
+        self._put = self.redis.register_script(_PUT)
+        self._release = self.redis.register_script(_RELEASE)
+
+    def _key(self, conversation_id: str) -> str:
+        return f"{self.prefix}:conv:{conversation_id}"
+
+    def _userKey(self, user_id: str) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    def version(self, conversation_id: str) -> int:
+        return int(self.redis.hget(self._key(conversation_id), "v") or 0)
+
+    def get(self, conversation_id: str):
+        entry = self.redis.hgetall(self._key(conversation_id))
+        if not entry:
+            return None
+        return int(entry[b"v"]), entry[b"user"].decode(), json.loads(entry[b"messages"])
+
+    def put(self, conversation_id: str, user_id: str, messages: list, expected: int) -> int:
+        version = self._put(
+            keys=[self._key(conversation_id), self._userKey(user_id)],
+            args=[expected, user_id, json.dumps(messages), self.ttl],
+        )
+        if version < 0:
+            raise StateConflict(f"Conversation {conversation_id} is at version {-version - 1}, expected {expected}")
+        return version
+
+    def delete(self, conversation_id: str) -> None:
+        self.redis.delete(self._key(conversation_id))
+
+    def delete_user(self, user_id: str) -> None:
+        keys = list(self.redis.smembers(self._userKey(user_id)))
+        self.redis.delete(self._userKey(user_id), *keys)
+
+    @contextmanager
+    def lock(self, conversation_id: str, timeout: float):
+        key = f"{self.prefix}:lock:{conversation_id}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while not self.redis.set(key, token, nx=True, px=self.lock_ttl * 1000):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"Conversation {conversation_id} is busy")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+        try:
+            yield
+        finally:
+            self._release(keys=[key], args=[token])
+
+def createState(kind: str, url: str = None, ttl: int = 86400, lock_ttl: int = 180):
+    """Shared state backend for STATE_BACKEND, or None to keep state in this process only."""
+    if not kind:
+        return None
+    if kind == "redis":
+        return RedisState(url or "redis://localhost:6379/0", ttl=ttl, lock_ttl=lock_ttl)
+    if kind == "local":
+        return LocalState()
+    raise ValueError(f"Unknown STATE_BACKEND {kind!r}; use redis or local")
@@ -1,30 +1,82 @@
+import os
+import threading
+from utils.db import supabase
+from utils.cache import TTLCache
+from utils import metrics
+
 DEFAULT_PROMPT = (
     "You are Luna, an AI assistant built by Abhishek. "
     "You have realtime access to the internet and can help with a variety of tasks. "
     "Use will only use one tool at a time"
 )
 
+# Per-user prompts rarely change, so keep them in-process; set_sys_prompt writes through
+_prompts = TTLCache(
+    maxsize=int(os.getenv("SYSTEM_PROMPT_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("SYSTEM_PROMPT_CACHE_TTL", "600")),
+)
+
+# Optional: with REDIS_URL set, invalidations are broadcast to the other workers
+INVALIDATION_CHANNEL = "system_prompt_invalidate"
+_redis = None
+if os.getenv("REDIS_URL"):
+    try:
+        import redis
+        _redis = redis.Redis.from_url(os.getenv("REDIS_URL"))
+    except ImportError:
+        print("REDIS_URL is set but the redis package is not installed; system prompt invalidation stays local")
+
+def _listen() -> None:
+    try:
+        pubsub = _redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(INVALIDATION_CHANNEL)
+        for message in pubsub.listen():
+            _prompts.pop(message["data"].decode())
+    except Exception as e:
+        print(f"System prompt invalidation listener stopped: {str(e)}")
+
+if _redis:
+    threading.Thread(target=_listen, name="system-prompt-invalidation", daemon=True).start()
+
+def invalidate_sys_prompt(user_id: str) -> None:
+    _prompts.pop(user_id)
+    if _redis:
+        try:
+            _redis.publish(INVALIDATION_CHANNEL, user_id)
+        except Exception as e:
+            print(f"Error broadcasting system prompt invalidation: {str(e)}")
+
+@metrics.span("system_prompt.get")
 def get_sys_prompt(user_id: str) -> str:
-    from utils.db import supabase
+    cached = _prompts.get(user_id)
+    if cached is not None:
+        return cached
     try:
         # from users table update system_prompt column with user_id
         res = supabase.table("users")\
             .select("system_prompt")\
             .eq("user_id", user_id)\
             .execute()
-        if res.data:
-            return res.data[0].get("system_prompt", DEFAULT_PROMPT)        
+        prompt = res.data[0].get("system_prompt", DEFAULT_PROMPT) if res.data else DEFAULT_PROMPT
+        _prompts.set(user_id, prompt)
+        return prompt
     except Exception as e:
         print(f"Error getting system prompt: {str(e)}")
     return DEFAULT_PROMPT
 
+@metrics.span("system_prompt.set")
 def set_sys_prompt(user_id: str, value: str) -> None:
-    from utils.db import supabase
     try:
         # from users table update system_prompt column with user_id
         res = supabase.table("users")\
             .update({"system_prompt": value})\
             .eq("user_id", user_id)\
             .execute()
+        invalidate_sys_prompt(user_id)
+        if res.data:
+            _prompts.set(user_id, value)
     except Exception as e:
         print(f"Error setting system prompt: {str(e)}")
+
+def stats() -> dict:
+    return dict(_prompts.stats(), broadcast=bool(_redis))
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+class WriteBehindQueue:
+    """
+    Background persistence for conversations.
+
+    Saves are queued per conversation and coalesced, so several saves of the
+    same conversation cost one write. A background thread flushes when
+    max_pending conversations are waiting or every flush_interval seconds;
+    failed writes are retried with backoff up to max_retries times.
+    flush_fn(conversation_id, user_id, messages, truncate_to) does the write.
+
+    A conversation stays visible through pending() until its write has
+    succeeded (or been given up on), including while it is being written
+    and while it waits for a retry. discard() waits for an in-flight flush,
+    so a deleted conversation can't be written back after the delete.
+    """
+
+    def __init__(self, flush_fn, max_pending: int = 50, flush_interval: float = 1.0, max_retries: int = 5):
+        self.flush_fn = flush_fn
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.flushed = 0
+        self.coalesced = 0
+        self.failures = 0
+        self._pending = OrderedDict()
+        self._inflight = {}  # conversation_id -> entry being written
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def _start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, conversation_id: str, user_id: str, messages: list, truncate_to: int = None) -> None:
+        with self._cond:
+            entry = self._pending.pop(conversation_id, None)
+            if entry:
+                self.coalesced += 1
+                if entry["truncate_to"] is not None:
+                    truncate_to = entry["truncate_to"] if truncate_to is None else min(truncate_to, entry["truncate_to"])
+            self._pending[conversation_id] = {
+                "user_id": user_id,
+                "messages": messages,
+                "truncate_to": truncate_to,
+                "attempts": 0,
+                "not_before": 0,
+            }
+            self._start()
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def pending(self, conversation_id: str):
+        """Messages still waiting to be written, so reads see this worker's own writes."""
+        with self._cond:
+            entry = self._pending.get(conversation_id) or self._inflight.get(conversation_id)
+            return list(entry["messages"]) if entry else None
+
+    def discard(self, conversation_id: str = None, user_id: str = None) -> None:
+        """Drop queued writes; call before deleting from the backend."""
+        # Holding the flush lock means no write of these conversations is in flight
+        with self._flush_lock, self._cond:
+            for cid in [cid for cid, e in self._pending.items() if cid == conversation_id or e["user_id"] == user_id]:
+                del self._pending[cid]
+
+    def _take(self, force: bool) -> list:
+        now = time.monotonic()
+        with self._cond:
+            ready = [cid for cid, e in self._pending.items() if force or e["not_before"] <= now]
+            taken = [(cid, self._pending.pop(cid)) for cid in ready]
+            self._inflight.update(taken)
+            return taken
+
+    def _done(self, conversation_id: str, entry: dict) -> None:
+        with self._cond:
+            if self._inflight.get(conversation_id) is entry:
+                del self._inflight[conversation_id]
+
+    def flush(self, force: bool = True) -> None:
+        with self._flush_lock:
+            for conversation_id, entry in self._take(force):
+                try:
+                    self.flush_fn(conversation_id, entry["user_id"], list(entry["messages"]), entry["truncate_to"])
+                    self.flushed += 1
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Error writing conversation {conversation_id}: {str(e)}")
+                    self._retry(conversation_id, entry)
+                self._done(conversation_id, entry)
+
+    def _retry(self, conversation_id: str, entry: dict) -> None:
+        entry["attempts"] += 1
+        if entry["attempts"] > self.max_retries:
+            print(f"Giving up on conversation {conversation_id} after {self.max_retries} retries")
+            return
+        with self._cond:
+            newer = self._pending.get(conversation_id)
+            if newer:
+                # A newer save is queued; carry the truncation over and let it win
+                if entry["truncate_to"] is not None:
+                    newer["truncate_to"] = min(entry["truncate_to"], newer["truncate_to"] if newer["truncate_to"] is not None else entry["truncate_to"])
+                return
+            entry["not_before"] = time.monotonic() + min(30, 0.5 * 2 ** entry["attempts"])
+            self._pending[conversation_id] = entry
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=self.flush_interval)
+            self.flush(force=False)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "inflight": len(self._inflight),
+            "flushed": self.flushed,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+        }